@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+
+from density import cell_indices
+
+
+# Columns the Games view can filter on
+FILTER_COLUMNS = ['Team', 'Event', 'Type']
+
+
+# Tournament-wide counts over the combined event store. One bincount fills a cube of heatmap grids for every
+# (team, event, type) combination, and another counts events per (team, player, event, type). Any filter is
+# then a slice and sum of those arrays, cached per filter combination until the store's data changes.
+class EventAggregates:
+    def __init__(self, events, slices, bins=(20, 10)):
+        self.bins = bins
+        self.slices = slices
+        self.categories = {}
+        self._codes = {}
+        for column in FILTER_COLUMNS:
+            # The store's columns share dictionaries with the player dataset, so only the values present here are kept
+            values = events[column].astype('category').cat.remove_unused_categories()
+            self.categories[column] = list(values.cat.categories)
+            # Shifted by one so code 0 is a missing value
+            self._codes[column] = values.cat.codes.to_numpy().astype(np.int64) + 1
+        sizes = tuple(len(self.categories[column]) + 1 for column in FILTER_COLUMNS)
+        cells = bins[0] * bins[1]
+
+        # Event X runs along the pitch and Y across it, as in create_heatmap
+        self._cells = cell_indices(events['X'].to_numpy(dtype=float, na_value=np.nan),
+                                   events['Y'].to_numpy(dtype=float, na_value=np.nan), bins)
+        on_pitch = self._cells >= 0
+        groups = np.ravel_multi_index([self._codes[column] for column in FILTER_COLUMNS], sizes)
+        self.grids = np.bincount(groups[on_pitch] * cells + self._cells[on_pitch],
+                                 minlength=int(np.prod(sizes)) * cells).reshape(sizes + (bins[1], bins[0]))
+
+        # Per-player totals count every event, on the pitch or not. Players are keyed with their team,
+        # so the team filter is a mask over players rather than another dimension.
+        team_categories = events['Team'].astype('category').cat
+        player_categories = events['Player'].astype('category').cat
+        pairs = (team_categories.codes.to_numpy().astype(np.int64) * (len(player_categories.categories) + 1) +
+                 player_categories.codes.to_numpy() + 1)
+        unique_pairs, self._players = np.unique(pairs, return_inverse=True)
+        self._players = self._players.reshape(-1)
+        teams, players = np.divmod(unique_pairs, len(player_categories.categories) + 1)
+        self.players = [(team_categories.categories[team] if team >= 0 else None,
+                         player_categories.categories[player - 1] if player > 0 else None)
+                        for team, player in zip(teams, players)]
+        self._player_teams = np.array([team for team, _ in self.players], dtype=object)
+        event_types = np.ravel_multi_index([self._codes['Event'], self._codes['Type']], sizes[1:])
+        self.player_counts = np.bincount(self._players * int(np.prod(sizes[1:])) + event_types,
+                                         minlength=len(players) * int(np.prod(sizes[1:])))
+        self.player_counts = self.player_counts.reshape((len(players),) + sizes[1:])
+
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _index(self, filters):
+        # None leaves a column unfiltered; a value the data has never seen matches nothing
+        index = []
+        for column, value in zip(FILTER_COLUMNS, filters):
+            if value is None:
+                index.append(slice(None))
+            elif value in self.categories[column]:
+                index.append(self.categories[column].index(value) + 1)
+            else:
+                return None
+        return tuple(index)
+
+    def _match_mask(self, match, filters):
+        rows = self.slices.get(match, slice(0, 0))
+        mask = np.ones(rows.stop - rows.start, dtype=bool)
+        for column, value in zip(FILTER_COLUMNS, filters):
+            if value is not None:
+                code = self.categories[column].index(value) + 1 if value in self.categories[column] else -1
+                mask &= self._codes[column][rows] == code
+        return rows, mask
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        result = compute()
+        with self._lock:
+            self._cache[key] = result
+        return result
+
+    def grid(self, match=None, team=None, event=None, type=None):
+        # Unsmoothed counts on the same grid as density_grid, for one match or the whole tournament
+        filters = (team, event, type)
+
+        def compute():
+            if match is not None:
+                rows, mask = self._match_mask(match, filters)
+                cells = self._cells[rows][mask]
+                counts = np.bincount(cells[cells >= 0], minlength=self.bins[0] * self.bins[1])
+                return counts.reshape(self.bins[1], self.bins[0]).astype(float)
+            index = self._index(filters)
+            if index is None:
+                return np.zeros((self.bins[1], self.bins[0]))
+            grids = self.grids[index].reshape(-1, self.bins[1], self.bins[0])
+            return grids.sum(axis=0).astype(float)
+
+        return self._cached(('grid', match) + filters, compute)
+
+    def player_totals(self, match=None, team=None, event=None, type=None):
+        # [(team, player, events)] with the busiest players first
+        filters = (team, event, type)
+
+        def compute():
+            if match is not None:
+                rows, mask = self._match_mask(match, filters)
+                counts = np.bincount(self._players[rows][mask], minlength=len(self.players))
+            else:
+                index = self._index(filters)
+                if index is None:
+                    return []
+                counts = self.player_counts[(slice(None),) + index[1:]].reshape(len(self.players), -1).sum(axis=1)
+                if team is not None:
+                    counts = np.where(self._player_teams == team, counts, 0)
+            order = np.argsort(-counts, kind='stable')
+            return [self.players[i] + (int(counts[i]),) for i in order if counts[i]]
+
+        return self._cached(('players', match) + filters, compute)
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aggregates import EventAggregates  # noqa: E402
+from density import density_grid  # noqa: E402
+from event_store import read_events  # noqa: E402
+
+
+# The real match files resampled into a tournament of 64 matches between 32 teams
+def synthetic_tournament(rows, matches=64, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.concat([read_events(os.path.join(ROOT, name)) for name in os.listdir(ROOT)
+                      if name.endswith('-round16.csv')], ignore_index=True)
+    teams = np.array([f'T{t:02d}' for t in range(32)])
+    events = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    team = rng.integers(0, 32, rows)
+    events['Team'] = teams[team]
+    events['Player'] = np.char.add(teams[team], np.char.add('-P', rng.integers(0, 26, rows).astype(str)))
+    events.insert(0, 'Match', np.repeat([f'M{m:02d}' for m in range(matches)], -(-rows // matches))[:rows])
+    for column in ['Match', 'Team', 'Player', 'Event', 'Type']:
+        events[column] = events[column].astype('category')
+    bounds = np.searchsorted(events['Match'].cat.codes.to_numpy(), np.arange(matches + 1))
+    slices = {f'M{m:02d}': slice(int(bounds[m]), int(bounds[m + 1])) for m in range(matches)}
+    return events, slices
+
+
+def loop_over_matches(events, slices, team, event):
+    # What a tournament view costs without the aggregates: filter and bin each match in turn
+    total = np.zeros((10, 20))
+    for rows in slices.values():
+        df = events.iloc[rows]
+        if team is not None:
+            df = df[df['Team'] == team]
+        if event is not None:
+            df = df[df['Event'] == event]
+        total += density_grid(df['X'].to_numpy(dtype=float, na_value=np.nan),
+                              df['Y'].to_numpy(dtype=float, na_value=np.nan), bins=(20, 10), sigma=0)
+    return total
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    events, slices = synthetic_tournament(rows)
+
+    start = time.perf_counter()
+    aggregates = EventAggregates(events, slices)
+    print(f"{rows:,} events, {len(slices)} matches: aggregates built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for team, event in [(None, None), ('T03', None), (None, 'Pass'), ('T03', 'Shot')]:
+        start = time.perf_counter()
+        expected = loop_over_matches(events, slices, team, event)
+        loop = time.perf_counter() - start
+        start = time.perf_counter()
+        grid = aggregates.grid(team=team, event=event)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        aggregates.grid(team=team, event=event)
+        cached = time.perf_counter() - start
+        assert np.array_equal(grid, expected)
+        print(f"team={team!s:<5} event={event!s:<5} loop {loop * 1000:8.1f} ms   aggregates {first * 1000:7.3f} ms"
+              f"   cached {cached * 1000:7.4f} ms")
+
+    start = time.perf_counter()
+    aggregates.player_totals(event='Pass')
+    print(f"player totals (event=Pass) {(time.perf_counter() - start) * 1000:.2f} ms")
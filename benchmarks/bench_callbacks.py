@@ -0,0 +1,160 @@
+import argparse
+import ast
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Files main.py reads from its working directory besides the match files
+SUPPORT_FILES = ['player-stats.csv', 'fifa-team-stats.csv', 'Mbappe.png']
+
+
+# Each match file and the player dataset repeated `scale` times with coordinates jittered by a few units,
+# so bins, filters and renders see realistic but larger inputs
+def write_scaled_data(directory, scale, seed=0):
+    rng = np.random.default_rng(seed)
+    for name in os.listdir(ROOT):
+        if not name.endswith('.csv') or name in SUPPORT_FILES:
+            continue
+        df = pd.read_csv(os.path.join(ROOT, name), dtype=str)
+        scaled = pd.concat([df] * scale, ignore_index=True)
+        if scale > 1:
+            for column in ['X', 'Y', 'X2', 'Y2']:
+                if column in scaled:
+                    values = pd.to_numeric(scaled[column], errors='coerce')
+                    jitter = rng.integers(-3, 4, len(values))
+                    jittered = (values + jitter).clip(0, 100).astype('Int64').astype(str)
+                    scaled[column] = jittered.where(values.notna(), scaled[column])
+        scaled.to_csv(os.path.join(directory, name), index=False)
+    for name in SUPPORT_FILES:
+        shutil.copy(os.path.join(ROOT, name), directory)
+
+
+# Every player photo URL main.py can ask for, read from its source so the app needn't be imported
+def player_image_urls():
+    with open(os.path.join(ROOT, 'main.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            if node.targets[0].id in ('player_images', 'default_player_image'):
+                values[node.targets[0].id] = ast.literal_eval(node.value)
+    return list(values['player_images'].values()) + [values['default_player_image']]
+
+
+# A grey placeholder per photo, named as PlayerImageStore looks for them under PLAYER_IMAGE_OFFLINE_DIR
+def stub_player_images(directory):
+    from PIL import Image
+
+    os.makedirs(directory, exist_ok=True)
+    for url in player_image_urls():
+        Image.new('RGB', (200, 200), (90, 90, 90)).save(os.path.join(directory, os.path.basename(urlparse(url).path)))
+
+
+def percentiles(samples):
+    return {f'p{p}': float(np.percentile(samples, p)) * 1000 for p in (50, 95, 99)}
+
+
+def measure(fn, calls, repeat):
+    # Latency over every call, response size as Dash would send it, and peak Python allocations of one call
+    from plotly.io.json import to_json_plotly
+
+    timings = []
+    sizes = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter()
+            result = fn(*args)
+            timings.append(time.perf_counter() - start)
+            sizes.append(len(to_json_plotly(result)))
+    tracemalloc.start()
+    fn(*calls[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'calls': len(timings), **percentiles(timings), 'bytes': float(np.mean(sizes)), 'peak_alloc': peak}
+
+
+def run_child(scale, repeat):
+    sys.path.insert(0, ROOT)
+    import main
+
+    main.player_thumbnails.wait()
+
+    games = [(game,) for game in main.game_options if game in main.match_events]
+    players = [(team, option['value']) for team in main.get_exp_index().teams
+               for option in main.update_player_dropdown(team)]
+    cases = {
+        'update_graph positions': (lambda game: main.update_graph(game, 'positions'), games),
+        'update_graph heatmap': (lambda game: main.update_graph(game, 'heatmap'), games),
+        'update_graph density': (lambda game: main.update_graph(game, 'density'), games),
+        'update_graph all games, by team': (lambda team: main.update_graph(main.ALL_GAMES, 'heatmap', team),
+                                            [(team,) for team in main.filter_options()[0][2]]),
+        'update_visualization heatmap': (lambda team, player: main.update_visualization(team, player, 'heatmap'),
+                                         players),
+        'update_visualization chances_created': (
+            lambda team, player: main.update_visualization(team, player, 'chances_created'), players),
+        'update_visualization chances_created_vector': (
+            lambda team, player: main.update_visualization(team, player, 'chances_created_vector'), players),
+        'update_player_dropdown': (main.update_player_dropdown, [(team,) for team in main.get_exp_index().teams]),
+    }
+    results = {}
+    for name, (fn, calls) in cases.items():
+        results[name] = measure(fn, calls, repeat)
+    main.render_executor.shutdown()
+    with open('/proc/self/status') as f:
+        peak_rss_kb = int(re.search(r'VmHWM:\s+(\d+) kB', f.read()).group(1))
+    print(json.dumps({'scale': scale, 'peak_rss_kb': peak_rss_kb, 'results': results}))
+
+
+def run_scale(scale, repeat, env):
+    with tempfile.TemporaryDirectory() as directory:
+        write_scaled_data(directory, scale)
+        images = os.path.join(directory, 'images')
+        stub_player_images(images)
+        child_env = dict(env, PLAYER_IMAGE_OFFLINE_DIR=images, PLAYER_IMAGE_DIR=os.path.join(directory, 'thumbnails'),
+                         RENDERED_IMAGE_DIR=os.path.join(directory, 'rendered'), RENDER_CACHE_MAX_BYTES='0',
+                         RENDER_CACHE_DIR='')
+        child_env.pop('RENDER_CACHE_URL', None)
+        child_env.pop('SHARED_EVENTS', None)
+        child_env.pop('COLUMNAR_DIR', None)
+        child_env.pop('LIVE_DIR', None)
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(scale), '--repeat', str(repeat)],
+                                cwd=directory, env=child_env, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.stderr.write(result.stderr)
+            raise SystemExit(f"Benchmark at scale {scale} failed")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time each Dash callback on synthetic data scaled up from the CSVs")
+    parser.add_argument('--scales', default='1,10,100', help="comma-separated data multipliers, e.g. 1,10,100,1000,10000")
+    parser.add_argument('--repeat', type=int, default=3, help="passes over every game/player per callback")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.repeat)
+        raise SystemExit
+
+    # Renders run inline by default so their cost lands in the callback; the render cache is off throughout
+    env = dict(os.environ, RENDER_POOL_SIZE=os.environ.get('RENDER_POOL_SIZE', '0'))
+    print(f"{'scale':>6}  {'callback':<45} {'calls':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          f" {'resp KiB':>9} {'peak alloc MiB':>15}")
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        run = run_scale(scale, args.repeat, env)
+        for name, result in run['results'].items():
+            print(f"{scale:>6}  {name:<45} {result['calls']:>5} {result['p50']:>9.1f} {result['p95']:>9.1f}"
+                  f" {result['p99']:>9.1f} {result['bytes'] / 1024:>9.1f} {result['peak_alloc'] / 2**20:>15.1f}")
+        print(f"{scale:>6}  peak RSS {run['peak_rss_kb'] / 1024:.0f} MiB")
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import columnar  # noqa: E402
+from event_store import read_events  # noqa: E402
+
+
+# Each load runs in a fresh interpreter; VmHWM (peak RSS) is read from /proc because ru_maxrss
+# carries over the parent's peak across exec. The query touches one team's coordinates.
+LOAD = """
+import re, sys, time
+import pandas as pd
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{load}
+loaded = time.perf_counter() - start
+heat = df[df['Team'] == 'T00']['X'].to_numpy(dtype=float, na_value=float('nan'))
+queried = time.perf_counter() - start
+with open('/proc/self/status') as f:
+    print(loaded, queried, re.search(r'VmHWM:\\s+(\\d+) kB', f.read()).group(1))
+"""
+
+LOADERS = {
+    'pd.read_csv': "df = pd.read_csv({csv!r})",
+    'read_events (CSV)': "from event_store import read_events; df = read_events({csv!r})",
+    'columnar (mmap)': "import columnar; df, schema = columnar.read_table({table!r})",
+}
+
+
+# The real match files resampled to a tracking-scale event feed over 32 teams
+def synthetic_events(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.concat([read_events(os.path.join(ROOT, name)) for name in os.listdir(ROOT)
+                      if name.endswith('-round16.csv')], ignore_index=True)
+    teams = np.array([f'T{t:02d}' for t in range(32)])
+    team = rng.integers(0, 32, rows)
+    sample = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    sample['Team'] = teams[team]
+    sample['Player'] = np.char.add(teams[team], np.char.add('-P', rng.integers(0, 26, rows).astype(str)))
+    return sample
+
+
+def load(code, **paths):
+    script = LOAD.format(root=ROOT, load=code.format(**paths))
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    loaded, queried, peak_rss_kb = result.stdout.split()
+    return float(loaded), float(queried), int(peak_rss_kb)
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        csv = os.path.join(directory, 'events.csv')
+        table = os.path.join(directory, 'events')
+        events = synthetic_events(rows)
+        events.to_csv(csv, index=False)
+        start = time.perf_counter()
+        columnar.write_table(read_events(csv), table)
+        print(f"{rows:,} events: CSV {os.path.getsize(csv) / 2**20:.0f} MiB, "
+              f"columnar {sum(os.path.getsize(os.path.join(table, f)) for f in os.listdir(table)) / 2**20:.0f} MiB, "
+              f"ingest {time.perf_counter() - start:.1f}s")
+        for label, code in LOADERS.items():
+            loaded, queried, peak_rss_kb = load(code, csv=csv, table=table)
+            print(f"{label:<18} load {loaded * 1000:8.1f} ms   load+team query {queried * 1000:8.1f} ms"
+                  f"   peak RSS {peak_rss_kb / 1024:7.1f} MiB")
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+import numpy as np
+from mplsoccer import Pitch
+from scipy.ndimage import gaussian_filter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from density import density_grid, density_grids  # noqa: E402
+
+
+def per_call_ms(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+# What the renderers did per request before density.py: mplsoccer's binned statistic, then scipy's filter
+def bin_statistic_path(pitch, x, y, bins):
+    statistic = pitch.bin_statistic(x, y, statistic='count', bins=bins)['statistic']
+    return gaussian_filter(statistic, 1)
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pitch = Pitch(pitch_type='wyscout')
+    rng = np.random.default_rng(0)
+    # create_heatmap bins a match (a few dozen events); create_second_heatmap bins one player
+    for bins, points in [((20, 10), 25), ((25, 25), 10), ((20, 10), 100_000)]:
+        x = rng.integers(0, 101, points).astype(float)
+        y = rng.integers(0, 101, points).astype(float)
+        assert np.array_equal(bin_statistic_path(pitch, x, y, bins), density_grid(x, y, bins))
+        before = per_call_ms(lambda: bin_statistic_path(pitch, x, y, bins), calls)
+        after = per_call_ms(lambda: density_grid(x, y, bins), calls)
+        print(f"bins={bins!s:<8} points={points:<7,} bin_statistic+gaussian_filter {before:7.3f} ms"
+              f"   density_grid {after:7.3f} ms   x{before / after:5.1f}")
+
+    # Batched: one grid per player of a 32-team tournament in a single call
+    groups, points, bins = 832, 200_000, (25, 25)
+    x = rng.integers(0, 101, points).astype(float)
+    y = rng.integers(0, 101, points).astype(float)
+    owner = rng.integers(0, groups, points)
+    start = time.perf_counter()
+    one_by_one = [density_grid(x[owner == g], y[owner == g], bins) for g in range(groups)]
+    looped = time.perf_counter() - start
+    start = time.perf_counter()
+    batched = density_grids(x, y, owner, groups, bins)
+    batch = time.perf_counter() - start
+    assert np.array_equal(np.stack(one_by_one), batched)
+    print(f"{groups} player grids, {points:,} points: loop {looped * 1000:.1f} ms   batched {batch * 1000:.1f} ms")
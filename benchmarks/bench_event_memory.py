@@ -0,0 +1,92 @@
+import argparse
+import gc
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_callbacks import write_scaled_data  # noqa: E402
+from event_schema import CATEGORY_COLUMNS, COORDINATE_COLUMNS, EVENT_COLUMNS, MISSING_VALUES  # noqa: E402
+import event_schema  # noqa: E402
+from event_store import EventStore  # noqa: E402
+
+PLAYERS_FILE = 'Expanded_Dataset_with_Additional_Players.csv'
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        return int(re.search(r'VmRSS:\s+(\d+) kB', f.read()).group(1))
+
+
+# What a worker held before event_schema: every match parsed to string columns and kept for reloads, the
+# combined frame with categories built from those strings, and the player dataset as pd.read_csv gives it
+def load_strings(files):
+    frames = {}
+    for key, filename in files.items():
+        df = pd.read_csv(filename, na_values=MISSING_VALUES).reindex(columns=EVENT_COLUMNS)
+        for column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype('string')
+        for column in COORDINATE_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').round().astype('UInt8')
+        frames[key] = df
+    events = pd.concat(frames.values(), keys=frames.keys(), names=['Match', None]).reset_index(level=0)
+    events = events.reset_index(drop=True)
+    for column in ['Match'] + CATEGORY_COLUMNS:
+        events[column] = events[column].astype('category')
+    return [events] + list(frames.values()) + [pd.read_csv(PLAYERS_FILE)]
+
+
+def load_typed(files):
+    store = EventStore(files)
+    return [store.events] + list(store._frames.values()) + [event_schema.read_csv(PLAYERS_FILE, store.dictionaries)]
+
+
+def run_child(layout):
+    files = {name[:-4]: name for name in sorted(os.listdir('.')) if name.endswith('.csv') and name != PLAYERS_FILE
+             and not name.startswith(('player-stats', 'fifa-team-stats'))}
+    gc.collect()
+    start = rss_kb()
+    # Live allocations are what the worker keeps; RSS also counts what the parser freed but malloc still holds
+    tracemalloc.start()
+    frames = (load_strings if layout == 'strings' else load_typed)(files)
+    gc.collect()
+    live = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(json.dumps({'rss_kb': rss_kb() - start, 'live_bytes': live, 'rows': len(frames[0]) + len(frames[-1]),
+                      'combined_bytes': int(frames[0].memory_usage(deep=True).sum()),
+                      'players_bytes': int(frames[-1].memory_usage(deep=True).sum())}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory a worker spends on the event data, before and after "
+                                                 "the typed event schema")
+    parser.add_argument('--scales', default='100,1000,10000', help="comma-separated data multipliers")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        raise SystemExit
+
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            write_scaled_data(directory, scale)
+            results = {}
+            for layout in ['strings', 'typed']:
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', layout], cwd=directory,
+                                        capture_output=True, text=True, check=True).stdout
+                results[layout] = json.loads(output.strip().splitlines()[-1])
+        before, after = results['strings'], results['typed']
+        print(f"x{scale:<6} {before['rows']:>10,} rows   live {before['live_bytes'] / 2**20:7.1f} MiB ->"
+              f" {after['live_bytes'] / 2**20:6.1f} MiB   worker RSS {before['rss_kb'] / 1024:7.1f} MiB ->"
+              f" {after['rss_kb'] / 1024:6.1f} MiB   combined events {before['combined_bytes'] / 2**20:6.1f} ->"
+              f" {after['combined_bytes'] / 2**20:5.1f} MiB   players {before['players_bytes'] / 2**20:6.1f} ->"
+              f" {after['players_bytes'] / 2**20:5.1f} MiB")
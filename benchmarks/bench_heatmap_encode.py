@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+from mplsoccer import Pitch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+import renderers  # noqa: E402
+
+
+def draw_figure(df):
+    pitch = Pitch(pitch_type='wyscout', pitch_color='#22312b', line_color='#c7d5cc',
+                  stripe_color='#22312b', stripe_zorder=1)
+    fig, ax = pitch.draw(figsize=(10, 6))
+    bin_statistic = pitch.bin_statistic(df['X'].to_numpy(float), df['Y'].to_numpy(float),
+                                        statistic='count', bins=(20, 10))
+    pcm = pitch.heatmap(bin_statistic, ax=ax, cmap='hot', edgecolors='#22312b')
+    fig.colorbar(pcm, ax=ax, shrink=0.6)
+    return fig
+
+
+# The pre-change path: encode, decode, flip, encode again
+def round_trip_encode(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    buf.seek(0)
+    plt.close(fig)
+    img = Image.open(buf).transpose(Image.FLIP_TOP_BOTTOM)
+    buf = io.BytesIO()
+    img.save(buf, format='png')
+    return buf.getvalue()
+
+
+def measure(encode, df, repeat):
+    timings = []
+    peaks = []
+    for _ in range(repeat):
+        fig = draw_figure(df)
+        tracemalloc.start()
+        start = time.perf_counter()
+        encode(fig)
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return np.median(timings) * 1000, np.median(peaks) / 1024
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    df = main.get_match_events('ARG-AUS')
+    for name, encode in [('decode/flip/re-encode', round_trip_encode), ('single encode', renderers.encode_flipped_png)]:
+        ms, kib = measure(encode, df, repeat)
+        print(f"{name:<24} {ms:8.1f} ms  {kib:9.0f} KiB peak allocated")
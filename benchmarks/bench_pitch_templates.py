@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import renderers  # noqa: E402
+
+
+def sample_events(n=20, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 101, n).astype(float) for _ in range(4)]
+
+
+RENDERS = {
+    'heatmap': lambda x, y, x2, y2, image: renderers.render_heatmap(x, y),
+    'player_heatmap': lambda x, y, x2, y2, image: renderers.render_second_heatmap(x, y, 'Heatmap', image),
+    'passes': lambda x, y, x2, y2, image: renderers.render_line_breaking_passes_chart(x, y, x2, y2, 'Passes', image),
+}
+
+
+def fresh_pitch_ms(style, repeat):
+    # What every render paid before templates: build and draw a new Pitch
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pitch, fig, ax = renderers.draw_pitch(style)
+        timings.append(time.perf_counter() - start)
+        plt.close(fig)
+    return np.median(timings) * 1000
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    events = sample_events()
+    image = Image.new('RGB', (100, 100), 'white')
+    print(f"{'style':<16}{'fresh pitch':>14}{'template pitch':>16}{'plot':>10}{'encode':>10}   (median ms)")
+    for style, render in RENDERS.items():
+        fresh = fresh_pitch_ms(style, repeat)
+        render(*events, image)  # first call draws the template
+        phases = {'pitch': [], 'plot': [], 'encode': []}
+        for _ in range(repeat):
+            render(*events, image)
+            for name, seconds in renderers.render_timings.phases.items():
+                phases[name].append(seconds)
+        medians = {name: np.median(values) * 1000 for name, values in phases.items()}
+        print(f"{style:<16}{fresh:>14.1f}{medians['pitch']:>16.3f}{medians['plot']:>10.1f}{medians['encode']:>10.1f}")
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from player_index import PlayerIndex  # noqa: E402
+
+
+# Scale Expanded_Dataset_with_Additional_Players.csv up to a whole-tournament feed:
+# 32 teams x 26 players, coordinates resampled from the real rows
+def synthetic_exp_data(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(os.path.join(ROOT, 'Expanded_Dataset_with_Additional_Players.csv'))
+    teams = np.array([f'T{t:02d}' for t in range(32)])
+    team = rng.integers(0, 32, rows)
+    sample = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    sample['Team'] = teams[team]
+    sample['Player'] = np.char.add(teams[team], np.char.add('-P', rng.integers(0, 26, rows).astype(str)))
+    return sample
+
+
+def time_calls(fn, calls):
+    start = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - start) / len(calls) * 1000
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    exp_data = synthetic_exp_data(rows)
+    rng = np.random.default_rng(1)
+    pairs = exp_data[['Team', 'Player']].iloc[rng.integers(0, rows, 20)].itertuples(index=False)
+    pairs = [tuple(pair) for pair in pairs]
+
+    start = time.perf_counter()
+    exp_index = PlayerIndex(exp_data)
+    print(f"{rows:,} rows, index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    scan_filter = time_calls(lambda t, p: exp_data[(exp_data['Team'] == t) & (exp_data['Player'] == p)], pairs)
+    index_filter = time_calls(exp_index.rows_for, pairs)
+    scan_players = time_calls(lambda t: exp_data[exp_data['Team'] == t]['Player'].unique(), [(t,) for t, _ in pairs])
+    index_players = time_calls(exp_index.players, [(t,) for t, _ in pairs])
+
+    print(f"update_visualization filter   scan {scan_filter:9.3f} ms   index {index_filter:9.3f} ms")
+    print(f"update_player_dropdown lookup scan {scan_players:9.3f} ms   index {index_players:9.3f} ms")
@@ -0,0 +1,49 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a gunicorn worker pays to import the app, and what it has resident afterwards
+WORKER_BOOT = """
+import resource, time
+start = time.perf_counter()
+import main
+{extra}
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def boot(extra='', env=None):
+    result = subprocess.run([sys.executable, '-c', WORKER_BOOT.format(extra=extra)], cwd=ROOT,
+                            capture_output=True, text=True, env=env, check=True)
+    seconds, max_rss_kb = result.stdout.split()[-2:]
+    return float(seconds), int(max_rss_kb)
+
+
+def import_profile():
+    # Modules imported directly by main, ranked by cumulative -X importtime microseconds
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    direct = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 3:
+            direct.append((int(match.group(2)), match.group(4)))
+    return sorted(direct, reverse=True)
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    env = dict(os.environ, PLAYER_IMAGE_OFFLINE_DIR=os.environ.get('PLAYER_IMAGE_OFFLINE_DIR', os.devnull))
+    for label, extra in [('import main', ''), ('import main + preload()', 'main.preload()')]:
+        samples = [boot(extra, env) for _ in range(runs)]
+        print(f"{label:<26} {statistics.median(s for s, _ in samples) * 1000:8.0f} ms"
+              f"   max RSS {statistics.median(r for _, r in samples) / 1024:6.1f} MiB")
+    print("\nSlowest imports made by main (cumulative):")
+    for micros, module in import_profile()[:10]:
+        print(f"  {micros / 1000:8.1f} ms  {module}")
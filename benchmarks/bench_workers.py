@@ -0,0 +1,118 @@
+import argparse
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.request import Request, urlopen
+
+from bench_callbacks import write_scaled_data
+from load_test import graph_request, start_gunicorn, visualization_request, wait_until_up
+
+
+# Requests whose answer is a rendered image, so each one is a render cache lookup
+def cached_mix():
+    games = ['ARG-AUS', 'BRA-KOR', 'ENG-SEN', 'MAR-ESP', 'MAR-FRA', 'NED-USA', 'POR-SUI', 'ARG_FRA']
+    return ([graph_request(game, 'heatmap') for game in games] + [graph_request('all', 'heatmap', 'ARG')] +
+            [visualization_request(team, player, 'heatmap') for team, player in [('ARG', 'Messi'), ('FRA', 'Mbappe')]])
+
+
+def post_all(url, bodies, concurrency):
+    # Each body once, spread over the workers by whichever one accepts the connection
+    pending = list(bodies)
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                body = pending.pop()
+            request = Request(url + '/_dash-update-component', data=body, headers={'Content-Type': 'application/json'})
+            with urlopen(request, timeout=300) as response:
+                response.read()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def fleet_pids(master):
+    pids = [master]
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    # The command name in parentheses may itself contain spaces
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+            if ppid == master:
+                pids.append(int(name))
+    return pids
+
+
+def pss_kb(pid):
+    # Proportional set size: pages mapped by several processes are split between them, so the sum over the
+    # fleet counts shared event tables and copy-on-write pages once
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        return int(re.search(r'^Pss:\s+(\d+) kB', f.read(), re.M).group(1))
+
+
+def render_counts(url):
+    with urlopen(url + '/metrics', timeout=30) as response:
+        text = response.read().decode('utf-8')
+    return [int(re.search(rf'^render_cache_{name}_total (\d+)', text, re.M).group(1)) for name in ('hits', 'misses')]
+
+
+def run(workers, shared, directory, port, preload):
+    name = f'bench-events-{os.getpid()}'
+    env = {'RENDER_POOL_SIZE': '0', 'APP_PRELOAD': '1' if preload else '0',
+           'SHARED_EVENTS': '1' if shared else '0', 'SHARED_EVENTS_NAME': name}
+    if not shared:
+        # Each worker keeps its renders to itself, as without a shared store
+        env['RENDER_CACHE_DIR'] = ''
+    url = f'http://127.0.0.1:{port}'
+    with tempfile.TemporaryDirectory() as scratch:
+        server = start_gunicorn(workers, port, scratch, cwd=directory, **env)
+        try:
+            wait_until_up(url, server)
+            bodies = cached_mix()
+            post_all(url, bodies, workers * 2)
+            before = render_counts(url) if shared else None
+            start = time.perf_counter()
+            post_all(url, bodies * workers, workers * 2)
+            second_pass = time.perf_counter() - start
+            after = render_counts(url) if shared else None
+            pss = sum(pss_kb(pid) for pid in fleet_pids(server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+    hit_rate = None
+    if shared:
+        hits, misses = after[0] - before[0], after[1] - before[1]
+        hit_rate = hits / (hits + misses) if hits + misses else None
+    return pss, second_pass, hit_rate
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fleet memory and render cache hit rate as gunicorn workers are "
+                                                 "added, with private and with shared event data and render cache")
+    parser.add_argument('--workers', default='1,2,4,8', help="comma-separated worker counts")
+    parser.add_argument('--scale', type=int, default=1000, help="data multiplier")
+    parser.add_argument('--preload', action='store_true', help="also load the app in the master (APP_PRELOAD=1)")
+    parser.add_argument('--port', type=int, default=8052)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_scaled_data(directory, args.scale)
+        for workers in [int(workers) for workers in args.workers.split(',')]:
+            line = [f"{workers:>2} workers"]
+            for shared in (False, True):
+                pss, second_pass, hit_rate = run(workers, shared, directory, args.port, args.preload)
+                label = 'shared' if shared else 'private'
+                rate = f"{hit_rate:6.1%} fleet hits" if hit_rate is not None else ''
+                line.append(f"{label} {pss / 1024:7.1f} MiB PSS, repeat pass {second_pass:5.2f} s {rate}")
+            print('   '.join(line).rstrip())
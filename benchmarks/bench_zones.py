@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_callbacks import percentiles, write_scaled_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_files import game_options  # noqa: E402
+from event_store import EventStore  # noqa: E402
+from zones import ZONES, Zone, ZoneIndex  # noqa: E402
+
+# (label, zone, end, match, filters)
+QUERIES = [
+    ('passes ending in either box', ZONES['Either penalty area'], True, None, {'event': 'Pass'}),
+    ('ARG shots from the right box', ZONES['Right penalty area'], False, None, {'team': 'ARG', 'event': 'Shot'}),
+    ('top half-space, one match', ZONES['Top half-space'], False, 'ARG_FRA', {}),
+    ('centre circle, every event', ZONES['Centre circle'], False, None, {}),
+    ('drawn polygon ending', Zone([(60, 10), (95, 30), (90, 85), (70, 60)]), True, None, {}),
+]
+
+
+def scan(events, slices, zone, end, match, filters):
+    # What the Games view would do without the index: test every event's coordinates, then its columns
+    df = events if match is None else events.iloc[slices[match]]
+    offset = 0 if match is None else slices[match].start
+    x, y = ('X2', 'Y2') if end else ('X', 'Y')
+    mask = zone.contains(df[x].to_numpy(dtype=float, na_value=np.nan), df[y].to_numpy(dtype=float, na_value=np.nan))
+    for name, value in filters.items():
+        mask &= (df[name.capitalize()] == value).fillna(False).to_numpy()
+    return np.flatnonzero(mask) + offset
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Zone queries through the zone index against a scan of every event")
+    parser.add_argument('--scales', default='1,100,1000', help="comma-separated data multipliers")
+    parser.add_argument('--repeat', type=int, default=50, help="runs of each query")
+    args = parser.parse_args()
+
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            write_scaled_data(directory, scale)
+            store = EventStore({key: os.path.join(directory, filename) for key, filename in game_options.items()})
+        events, slices = store._snapshot
+        start = time.perf_counter()
+        index = ZoneIndex(events, slices)
+        print(f"x{scale}: {len(events):,} events, index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for label, zone, end, match, filters in QUERIES:
+            # A zone's cells are worked out on its first query, once per zone rather than per event
+            start = time.perf_counter()
+            zone.runs
+            prepare = (time.perf_counter() - start) * 1000
+            indexed, rows = timed(lambda: index.rows(zone, end, match, **filters), args.repeat)
+            scanned, expected = timed(lambda: scan(events, slices, zone, end, match, filters), max(args.repeat // 10, 3))
+            assert np.array_equal(np.sort(rows), expected), label
+            print(f"  {label:<30} {len(rows):>9,} rows   index p50 {indexed['p50']:7.3f} ms  p99 {indexed['p99']:7.3f} ms"
+                  f"   scan p50 {scanned['p50']:8.2f} ms   zone cells {prepare:5.2f} ms")
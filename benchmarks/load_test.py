@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from bench_callbacks import ROOT, percentiles, stub_player_images
+
+GRAPH_OUTPUTS = [('graph-container', 'figure'), ('live-cursor', 'data'), ('live-interval', 'disabled')]
+VISUALIZATION_OUTPUTS = [('visualization_img', 'src'), ('visualization_graph', 'figure'), ('visualization_graph', 'style')]
+
+
+# The body the Dash renderer posts to /_dash-update-component when an input changes
+def update_body(outputs, inputs, changed):
+    body = {'inputs': [{'id': id, 'property': prop, 'value': value} for id, prop, value in inputs],
+            'changedPropIds': [changed]}
+    if len(outputs) == 1:
+        body['output'] = '.'.join(outputs[0])
+        body['outputs'] = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        body['output'] = '..' + '...'.join('.'.join(output) for output in outputs) + '..'
+        body['outputs'] = [{'id': id, 'property': prop} for id, prop in outputs]
+    return json.dumps(body).encode('utf-8')
+
+
+def graph_request(game, plot_type, team=None, zone=None, zone_point='start'):
+    return update_body(GRAPH_OUTPUTS, [('game-dropdown', 'value', game), ('plot-type-dropdown', 'value', plot_type),
+                                       ('team-filter', 'value', team), ('event-filter', 'value', None),
+                                       ('type-filter', 'value', None), ('zone-filter', 'value', zone),
+                                       ('zone-point', 'value', zone_point), ('drawn-zone', 'data', None)],
+                       'plot-type-dropdown.value')
+
+
+def visualization_request(team, player, visualization_type):
+    return update_body(VISUALIZATION_OUTPUTS, [('team_dropdown', 'value', team), ('player_dropdown', 'value', player),
+                                               ('visualization_dropdown', 'value', visualization_type)],
+                       'player_dropdown.value')
+
+
+# A mix of what users click through: every match in each Games plot, a tournament view and a few player cards
+def request_mix():
+    games = ['ARG-AUS', 'BRA-KOR', 'ENG-SEN', 'MAR-ESP', 'MAR-FRA', 'NED-USA', 'POR-SUI', 'ARG_FRA']
+    mix = [graph_request(game, plot_type) for game in games for plot_type in ('positions', 'heatmap', 'density')]
+    mix += [graph_request('all', 'heatmap', 'ARG'), graph_request('all', 'players'),
+            graph_request('all', 'positions', zone='Either penalty area', zone_point='end')]
+    mix += [visualization_request('ARG', 'Messi', 'heatmap'),
+            visualization_request('FRA', 'Mbappe', 'heatmap'),
+            visualization_request('ARG', 'Messi', 'chances_created'),
+            visualization_request('ARG', 'Messi', 'chances_created_vector')]
+    return mix
+
+
+def worker(url, bodies, deadline, offset, results, lock):
+    timings, sizes, errors = [], [], 0
+    i = offset
+    while time.perf_counter() < deadline:
+        request = Request(url + '/_dash-update-component', data=bodies[i % len(bodies)],
+                          headers={'Content-Type': 'application/json'})
+        i += 1
+        start = time.perf_counter()
+        try:
+            with urlopen(request, timeout=60) as response:
+                sizes.append(len(response.read()))
+        except (URLError, OSError):
+            errors += 1
+            continue
+        timings.append(time.perf_counter() - start)
+    with lock:
+        results['timings'].extend(timings)
+        results['sizes'].extend(sizes)
+        results['errors'] += errors
+
+
+def run_load(url, concurrency, duration):
+    bodies = request_mix()
+    results = {'timings': [], 'sizes': [], 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(url, bodies, deadline, n * 7, results, lock))
+               for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def wait_until_up(url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("gunicorn exited before serving")
+        try:
+            with urlopen(url + '/_dash-layout', timeout=5):
+                return
+        except (URLError, OSError):
+            time.sleep(0.5)
+    raise SystemExit(f"{url} did not come up within {timeout} s")
+
+
+# gunicorn with N workers serving main:server on the data in cwd (the repo's by default), with player photos
+# stubbed and rendered images kept under a temporary directory; overrides replace any of those variables
+def start_gunicorn(workers, port, directory, cwd=ROOT, **overrides):
+    images = os.path.join(directory, 'images')
+    stub_player_images(images)
+    env = dict(os.environ, PLAYER_IMAGE_OFFLINE_DIR=images, PLAYER_IMAGE_DIR=os.path.join(directory, 'thumbnails'),
+               RENDERED_IMAGE_DIR=os.path.join(directory, 'rendered'),
+               RENDER_CACHE_DIR=os.path.join(directory, 'render-cache'))
+    env.update(overrides)
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                             '--pythonpath', ROOT, '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                             '--timeout', '120', 'main:server'], cwd=cwd, env=env)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Post a mix of callback requests at a running app")
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--concurrency', type=int, default=8, help="simultaneous clients")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of load")
+    parser.add_argument('--gunicorn', type=int, metavar='WORKERS',
+                        help="start gunicorn with this many workers on --port instead of using --url")
+    parser.add_argument('--port', type=int, default=8051)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        url = args.url.rstrip('/')
+        if args.gunicorn:
+            url = f'http://127.0.0.1:{args.port}'
+            server = start_gunicorn(args.gunicorn, args.port, directory)
+        try:
+            if server is not None:
+                wait_until_up(url, server)
+            results, elapsed = run_load(url, args.concurrency, args.duration)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    timings = results['timings']
+    print(f"{len(timings)} responses in {elapsed:.1f} s from {args.concurrency} clients:"
+          f" {len(timings) / elapsed:.1f} req/s, {results['errors']} errors")
+    if timings:
+        latency = percentiles(timings)
+        print(f"latency p50 {latency['p50']:.1f} ms   p95 {latency['p95']:.1f} ms   p99 {latency['p99']:.1f} ms"
+              f"   mean response {np.mean(results['sizes']) / 1024:.1f} KiB")
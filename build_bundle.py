@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import plotly
+
+
+# Pre-render every match heatmap and every player's heatmap and chances created chart, across all cores, and
+# write them with the Games view pitches and the stats figures into a versioned bundle, e.g.
+#   python build_bundle.py bundle && BUNDLE_DIR=bundle gunicorn main:server
+def image_items(main):
+    # (label, render cache key, function returning the image's URL) for every PNG the views can ask for
+    items = []
+    for selected_game in main.match_events.keys():
+        items.append((f'heatmap {selected_game}', main.heatmap_key(selected_game),
+                      lambda selected_game=selected_game: main.create_heatmap(selected_game)))
+    charts = {'heatmap': ('second_heatmap', main.create_second_heatmap),
+              'chances_created': ('line_breaking_passes', main.create_line_breaking_passes_chart)}
+    exp_index = main.get_exp_index()
+    for selected_team in exp_index.teams:
+        for selected_player in exp_index.players(selected_team):
+            data = exp_index.rows_for(selected_team, selected_player)
+            player_image = main.player_images.get(selected_player, main.default_player_image)
+            for visualization_type, (name, create) in charts.items():
+                title = main.player_chart_title(selected_player, visualization_type)
+                items.append((f'{visualization_type} {selected_team} {selected_player}',
+                              main.player_chart_key(name, data, title, player_image),
+                              lambda create=create, data=data, title=title, player_image=player_image:
+                              create(data, title, player_image)))
+    return items
+
+
+def figure_items(main):
+    items = [(f'positions {selected_game}', main.soccer_pitch_key(selected_game),
+              lambda selected_game=selected_game: main.create_soccer_pitch(selected_game))
+             for selected_game in main.match_events.keys()]
+    items.append(('player stats', main.player_stats_key(), main.get_player_stats_fig))
+    items.append(('team stats', main.team_stats_key(), main.get_team_stats_fig))
+    return items
+
+
+def build_image(main, writer, label, key, create):
+    start = time.perf_counter()
+    url = create()
+    png = main.rendered_images.read(url)
+    if png is None:
+        raise RuntimeError(f"{label}: no image at {url}")
+    seconds = time.perf_counter() - start
+    writer.add_image(key, png, label, seconds)
+    return seconds
+
+
+def build_figure(writer, label, key, create):
+    start = time.perf_counter()
+    figure_json = json.dumps(create(), cls=plotly.utils.PlotlyJSONEncoder)
+    seconds = time.perf_counter() - start
+    writer.add_figure(key, figure_json, label, seconds)
+    return seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-render every match and player view into a static bundle")
+    parser.add_argument('output', help="bundle directory; each build adds a version and points LATEST at it")
+    parser.add_argument('--jobs', type=int, help="renders in flight at once (default: the render pool's size)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="render everything again rather than reuse the render cache")
+    args = parser.parse_args()
+
+    # The build renders from the data as it is now, never from an older bundle
+    os.environ['BUNDLE_DIR'] = ''
+    os.environ.setdefault('RENDER_TIMEOUT', '600')
+    if args.no_cache:
+        os.environ['RENDER_CACHE_DIR'] = ''
+        os.environ['RENDER_CACHE_MAX_BYTES'] = '0'
+        os.environ.pop('RENDER_CACHE_URL', None)
+
+    import main
+    from bundle import BundleWriter
+
+    main.player_thumbnails.wait()
+    jobs = args.jobs or main.render_executor.workers or os.cpu_count() or 1
+    writer = BundleWriter(args.output)
+    start = time.perf_counter()
+    failed = 0
+    try:
+        for label, key, create in figure_items(main):
+            print(f"{build_figure(writer, label, key, create) * 1000:9.1f} ms  {label}")
+        # Each thread waits on one render at a time, so the render pool's processes draw jobs images at once
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(build_image, main, writer, label, key, create): label
+                       for label, key, create in image_items(main)}
+            for future in as_completed(futures):
+                try:
+                    print(f"{future.result() * 1000:9.1f} ms  {futures[future]}")
+                except Exception as e:
+                    failed += 1
+                    print(f"   failed    {futures[future]}: {e!r}", file=sys.stderr)
+        wall = time.perf_counter() - start
+        # A bundle missing some views would be served as if complete, so a failed build leaves LATEST alone
+        if failed:
+            writer.abort()
+        else:
+            version = writer.commit(wall_seconds=round(wall, 3))
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        main.render_executor.shutdown()
+
+    seconds = [item['seconds'] for item in writer.items]
+    summary = (f"{len(seconds)} items in {wall:.1f} s wall with {jobs} jobs, {sum(seconds):.1f} s of item time, "
+               f"mean {sum(seconds) / max(len(seconds), 1) * 1000:.0f} ms, max {max(seconds, default=0) * 1000:.0f} ms")
+    if failed:
+        sys.exit(f"{failed} items failed; {args.output} was left as it was. {summary}")
+    print(f"Bundle {version} in {args.output}: {summary}")
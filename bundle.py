@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from image_store import ImageStore
+
+
+logger = logging.getLogger(__name__)
+
+# A bundle directory holds one subdirectory per version and LATEST, naming the one to serve
+MANIFEST_FILE = 'manifest.json'
+LATEST_FILE = 'LATEST'
+FORMAT_VERSION = 1
+
+
+# Images and Plotly figures written ahead of time by build_bundle.py, each under the key the app would cache
+# it by. The keys hash the inputs and source data, so an entry is served only while its data is unchanged;
+# anything else falls back to a live render. Images are served from <prefix><version>/<sha256>.png.
+class Bundle:
+    def __init__(self, root, prefix='/bundle/'):
+        with open(os.path.join(root, LATEST_FILE)) as f:
+            self.version = f.read().strip()
+        self.directory = os.path.join(root, self.version)
+        with open(os.path.join(self.directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format {self.manifest.get('format')} in {self.directory}")
+        self.images = ImageStore(os.path.join(self.directory, 'images'), prefix=prefix + self.version + '/')
+        self._images = self.manifest['images']
+        self._figures = self.manifest['figures']
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, root, prefix='/bundle/'):
+        # None when nothing has been built there yet, so the app starts and renders live
+        try:
+            return cls(root, prefix)
+        except (OSError, ValueError) as e:
+            logger.warning("Not serving a bundle from %s: %s", root, e)
+            return None
+
+    def init_app(self, server, route='/bundle/'):
+        self.images.init_app(server, route=route + self.version + '/', endpoint='bundle_image')
+
+    def image_url(self, key):
+        digest = self._images.get(key)
+        return self.images.prefix + digest + '.png' if digest else None
+
+    def figure(self, key):
+        # Parsed once per process; callers share the dict and must not change it
+        filename = self._figures.get(key)
+        if filename is None:
+            return None
+        with self._lock:
+            if key not in self._loaded:
+                with open(os.path.join(self.directory, 'figures', filename)) as f:
+                    self._loaded[key] = json.load(f)
+            return self._loaded[key]
+
+
+# Collects a bundle in a scratch directory next to the others, then moves it into place as a new version and
+# points LATEST at it. Running workers keep serving the version they opened until they restart.
+class BundleWriter:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._scratch = tempfile.mkdtemp(prefix='.building-', dir=root)
+        self.images = ImageStore(os.path.join(self._scratch, 'images'))
+        os.makedirs(os.path.join(self._scratch, 'figures'))
+        self.items = []
+        self._images = {}
+        self._figures = {}
+        self._lock = threading.Lock()
+
+    def add_image(self, key, png, item, seconds):
+        digest = self.images.put(png)[len(self.images.prefix):-len('.png')]
+        with self._lock:
+            self._images[key] = digest
+            self.items.append({'item': item, 'kind': 'image', 'key': key, 'seconds': round(seconds, 4)})
+
+    def add_figure(self, key, figure_json, item, seconds):
+        filename = hashlib.sha256(figure_json.encode('utf-8')).hexdigest() + '.json'
+        with open(os.path.join(self._scratch, 'figures', filename), 'w') as f:
+            f.write(figure_json)
+        with self._lock:
+            self._figures[key] = filename
+            self.items.append({'item': item, 'kind': 'figure', 'key': key, 'seconds': round(seconds, 4)})
+
+    def commit(self, **metadata):
+        # The version is a hash of the contents. Renders draw the grass texture at random, so each build of the same
+        # data is a new version all the same.
+        contents = json.dumps([sorted(self._images.items()), sorted(self._figures.items())])
+        version = hashlib.sha256(contents.encode('utf-8')).hexdigest()[:12]
+        manifest = {'format': FORMAT_VERSION, 'version': version, 'created': time.time(), 'images': self._images,
+                    'figures': self._figures, 'items': sorted(self.items, key=lambda item: item['item']), **metadata}
+        with open(os.path.join(self._scratch, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        directory = os.path.join(self.root, version)
+        if os.path.exists(directory):
+            shutil.rmtree(self._scratch)
+        else:
+            os.replace(self._scratch, directory)
+        tmp = os.path.join(self.root, LATEST_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            f.write(version + '\n')
+        os.replace(tmp, os.path.join(self.root, LATEST_FILE))
+        return version
+
+    def abort(self):
+        shutil.rmtree(self._scratch, ignore_errors=True)
@@ -0,0 +1,87 @@
+import glob
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from event_schema import MISSING_UINT8
+
+
+# A table on disk is one .npy file per column plus schema.json holding dtypes, category dictionaries and metadata.
+# Columns are memory-mapped on read, so a table much larger than RAM costs only the pages that are touched.
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+
+# Column files no schema refers to are kept this many seconds, for a reader that loaded an older schema but has
+# not mapped its columns yet, or a concurrent write that hasn't replaced the schema yet
+GENERATION_GRACE_SECONDS = 60
+
+
+def write_table(df, directory, metadata=None):
+    os.makedirs(directory, exist_ok=True)
+    # Column files carry a per-write generation so readers that still map the previous files are unaffected
+    generation = uuid.uuid4().hex[:12]
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        filename = f'{name}.{generation}.npy'
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            values = column.to_numpy(dtype=float, na_value=np.nan)
+            if np.nanmax(values, initial=0) >= MISSING_UINT8 or np.nanmin(values, initial=0) < 0:
+                raise ValueError(f"Column {name} does not fit in uint8")
+            np.save(os.path.join(directory, filename), np.where(np.isnan(values), MISSING_UINT8, np.round(values)).astype(np.uint8))
+            columns[name] = {'kind': 'uint8', 'file': filename}
+        else:
+            # Sorted dictionaries keep category order alphabetical, the same order pd.factorize(sort=True) gives
+            categorical = pd.Categorical(column.astype('string'), categories=sorted(column.dropna().unique()))
+            np.save(os.path.join(directory, filename), categorical.codes)
+            columns[name] = {'kind': 'category', 'file': filename, 'dictionary': list(categorical.categories)}
+
+    schema = {'version': FORMAT_VERSION, 'rows': len(df), 'columns': columns, 'metadata': metadata or {}}
+    old = read_schema(directory) if os.path.exists(os.path.join(directory, SCHEMA_FILE)) else None
+    tmp = os.path.join(directory, f'{SCHEMA_FILE}.{generation}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(schema, f)
+    os.replace(tmp, os.path.join(directory, SCHEMA_FILE))
+    remove_old_generations(directory, [schema, old])
+    return schema
+
+
+def remove_old_generations(directory, schemas):
+    # The previous generation stays until the next write, as readers may have just loaded its schema; anything
+    # older goes once it is past the grace period. Readers that already mapped a file keep it after unlinking.
+    keep = {column['file'] for schema in schemas if schema for column in schema['columns'].values()}
+    cutoff = time.time() - GENERATION_GRACE_SECONDS
+    for path in glob.glob(os.path.join(directory, '*.npy')):
+        if os.path.basename(path) in keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def read_schema(directory):
+    with open(os.path.join(directory, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    if schema.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version {schema.get('version')} in {directory}")
+    return schema
+
+
+def read_table(directory):
+    # Columns are views over the mapped files: category codes and uint8 values are not copied
+    schema = read_schema(directory)
+    columns = {}
+    for name, column in schema['columns'].items():
+        values = np.load(os.path.join(directory, column['file']), mmap_mode='r')
+        if column['kind'] == 'category':
+            dictionary = pd.Index(column['dictionary'], dtype='string')
+            columns[name] = pd.Categorical.from_codes(values, categories=dictionary, validate=False)
+        else:
+            columns[name] = pd.arrays.IntegerArray(values, values == MISSING_UINT8)
+    return pd.DataFrame(columns, copy=False), schema
@@ -0,0 +1,34 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/')
+
+
+# Compresses callback JSON, the layout and other text responses; brotli when the client accepts it and the
+# module is installed, otherwise gzip. Responses carrying an ETag are left alone, since Dash matches
+# If-None-Match against the uncompressed body's tag.
+def enable_compression(server, level=6, min_size=512):
+    def compress(response):
+        if (response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.get_etag()[0] or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        if brotli is not None and 'br' in request.accept_encodings:
+            response.set_data(brotli.compress(data, quality=min(level, 11)))
+            response.headers['Content-Encoding'] = 'br'
+        elif 'gzip' in request.accept_encodings:
+            response.set_data(gzip.compress(data, compresslevel=level))
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    server.after_request(compress)
@@ -0,0 +1,20 @@
+# The data the app is built from, in a module of its own so the command line tools can read it without
+# importing the Dash app
+
+# Match event files behind the Games view, by match key
+game_options = {
+    'ARG-AUS': 'ARG-AUS-round16.csv',
+    'ARG-CRO': 'ARG-CRO-semi-final.csv',
+    'ARG_FRA': 'the-final.csv',
+    'BRA-KOR': 'BRA-KOR-round16.csv',
+    'CRO-JPN': 'CRO-JPN-round16.csv',
+    'ENG-SEN': 'ENG-SEN-round16.csv',
+    'FRA-POL': 'FRA-POL-round16.csv',
+    'MAR-ESP': 'MAR-ESP-round16.csv',
+    'MAR-FRA': 'MAR-FRA-semi-final.csv',
+    'NED-USA': 'NED-USA-round16.csv',
+    'POR-SUI': 'POR-SUI-round16.csv',
+}
+
+# Every player's events across the tournament, behind the Players view
+PLAYER_EVENTS_FILE = 'Expanded_Dataset_with_Additional_Players.csv'
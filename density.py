@@ -0,0 +1,80 @@
+import functools
+
+import numpy as np
+
+
+# Wyscout coordinates run 0-100 on both axes, with y increasing down the pitch
+PITCH_EXTENT = 100
+
+
+def density_grid(x, y, bins, sigma=1):
+    # Same grid as Pitch(pitch_type='wyscout').bin_statistic(x, y, statistic='count', bins=bins)
+    # followed by gaussian_filter(..., sigma), without building a Pitch. Row 0 is y = 0.
+    cells = cell_indices(x, y, bins)
+    counts = np.bincount(cells[cells >= 0], minlength=bins[0] * bins[1])
+    return smooth(counts.reshape(bins[1], bins[0]).astype(float), sigma)
+
+
+def density_grids(x, y, groups, count, bins, sigma=1):
+    # density_grid for many games or players in one pass: groups[i] in range(count) says whose point i is
+    cells = cell_indices(x, y, bins)
+    keep = cells >= 0
+    flat = np.asarray(groups, dtype=np.int64)[keep] * (bins[0] * bins[1]) + cells[keep]
+    counts = np.bincount(flat, minlength=count * bins[0] * bins[1])
+    return smooth(counts.reshape(count, bins[1], bins[0]).astype(float), sigma)
+
+
+@functools.lru_cache(maxsize=None)
+def smoothing_taps(size, sigma):
+    # gaussian_filter1d (reflect mode, truncate 4) along an axis of this size, as precomputed tables:
+    # the kernel weights from the centre outwards, and each cell's reflected neighbours at every distance
+    radius = int(4 * float(sigma) + 0.5)
+    from scipy.ndimage import gaussian_filter1d
+
+    impulse = np.zeros(4 * radius + 1)
+    impulse[2 * radius] = 1
+    weights = gaussian_filter1d(impulse, sigma)[2 * radius:3 * radius + 1]
+    cells = np.arange(size)
+    left = [reflect(cells - distance, size) for distance in range(radius + 1)]
+    right = [reflect(cells + distance, size) for distance in range(radius + 1)]
+    return weights, left, right
+
+
+def reflect(index, size):
+    # scipy's 'reflect' boundary: d c b a | a b c d | d c b a
+    index = np.mod(index, 2 * size)
+    return np.where(index < size, index, 2 * size - 1 - index)
+
+
+def smooth_axis(statistic, axis, sigma):
+    weights, left, right = smoothing_taps(statistic.shape[axis], sigma)
+    # Same summation order as scipy's symmetric correlate1d, so results are bit-for-bit identical
+    smoothed = statistic * weights[0]
+    for distance in range(len(weights) - 1, 0, -1):
+        smoothed += (np.take(statistic, left[distance], axis=axis) +
+                     np.take(statistic, right[distance], axis=axis)) * weights[distance]
+    return smoothed
+
+
+def smooth(statistic, sigma=1):
+    # gaussian_filter(statistic, sigma) over the last two axes, so a stack of grids is smoothed in one call
+    if sigma == 0:
+        return statistic
+    return smooth_axis(smooth_axis(statistic, -2, sigma), -1, sigma)
+
+
+def bin_centers(bins):
+    return (np.arange(bins) + 0.5) * PITCH_EXTENT / bins
+
+
+def cell_indices(x, y, bins):
+    # Flat index of each point's cell in density_grid's statistic (row-major, row 0 is y = 0), or -1 off the grid.
+    # Edges fall as in np.histogram2d: bins are half-open except the last, and y is binned as PITCH_EXTENT - y.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = (x >= 0) & (x <= PITCH_EXTENT) & (y >= 0) & (y <= PITCH_EXTENT)
+    x = np.where(valid, x, 0)
+    y = np.where(valid, y, 0)
+    cols = np.minimum((x * bins[0] / PITCH_EXTENT).astype(np.int64), bins[0] - 1)
+    rows = bins[1] - 1 - np.minimum(((PITCH_EXTENT - y) * bins[1] / PITCH_EXTENT).astype(np.int64), bins[1] - 1)
+    return np.where(valid, rows * bins[0] + cols, -1)
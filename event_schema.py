@@ -0,0 +1,69 @@
+import threading
+
+import pandas as pd
+
+
+# Column layout shared by the match files, the player event dataset and the columnar tables
+EVENT_COLUMNS = ['Team', 'Player', 'Event', 'Type', 'X', 'Y', 'X2', 'Y2']
+CATEGORY_COLUMNS = ['Team', 'Player', 'Event', 'Type']
+COORDINATE_COLUMNS = ['X', 'Y', 'X2', 'Y2']
+
+# Some match files use '-' for a missing end position (e.g. MAR-ESP); others leave it blank (NED-USA)
+MISSING_VALUES = ['-']
+
+# Wyscout coordinates are 0-100, so they are held as UInt8: one byte per value plus its missing-value mask.
+# Written out as plain uint8 (columnar tables), the top of the range marks a missing value instead.
+MISSING_UINT8 = 255
+
+
+# One sorted dictionary per category column for everything a worker loads. The match events and the player
+# dataset share one copy of every team, player, event and type name, and equal codes mean equal values.
+# A dictionary only grows; frames typed before it grew keep their older dtype, which still compares by value.
+class Dictionaries:
+    def __init__(self):
+        self._dtypes = {}
+        self._lock = threading.Lock()
+
+    def dtype(self, column, values=()):
+        with self._lock:
+            dtype = self._dtypes.get(column)
+            known = dtype.categories if dtype is not None else pd.Index([], dtype='string')
+            new = pd.Index(values, dtype='string').dropna().unique().difference(known)
+            if dtype is None or len(new):
+                dtype = self._dtypes[column] = pd.CategoricalDtype(known.append(new).sort_values())
+            return dtype
+
+
+def category_column(values, dictionaries=None, column=None):
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('string').astype('category')
+    if dictionaries is None:
+        # Categories as the string dtype, the same as tables read back from columnar
+        return values.cat.rename_categories(pd.Index(values.cat.categories, dtype='string'))
+    return values.astype(dictionaries.dtype(column, values.cat.categories))
+
+
+def coordinate_column(values):
+    # Blanks, '-' and anything else that isn't a number become <NA>
+    return pd.to_numeric(values, errors='coerce').round().astype('UInt8')
+
+
+def typed(df, dictionaries=None):
+    # Category codes and UInt8 coordinates for whichever schema columns df has
+    columns = {}
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS:
+            columns[column] = category_column(df[column], dictionaries, column)
+        elif column in COORDINATE_COLUMNS:
+            columns[column] = coordinate_column(df[column])
+        else:
+            columns[column] = df[column]
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_csv(filename, dictionaries=None, columns=None):
+    # Category columns are parsed straight into categoricals, so no Python string is kept per row
+    df = pd.read_csv(filename, na_values=MISSING_VALUES, dtype={column: 'category' for column in CATEGORY_COLUMNS})
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    return typed(df, dictionaries)
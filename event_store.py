@@ -0,0 +1,177 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import event_schema
+from aggregates import EventAggregates
+from event_schema import CATEGORY_COLUMNS, EVENT_COLUMNS
+from zones import ZoneIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+def read_events(filename, dictionaries=None):
+    return event_schema.read_csv(filename, dictionaries, columns=EVENT_COLUMNS)
+
+
+# Every match file loaded once into one columnar frame, sliced by match key.
+# With columnar_directory set, the frame is mapped from a table written by ingest.py instead of parsed from CSV;
+# refresh, if given, is called before each check for a new table so it can rewrite one from changed CSVs first.
+class EventStore:
+    def __init__(self, files, columnar_directory=None, dictionaries=None, refresh=None):
+        self.files = dict(files)
+        self.columnar_directory = columnar_directory
+        self.refresh = refresh
+        self.dictionaries = dictionaries or event_schema.Dictionaries()
+        self.missing = []
+        self._frames = {}
+        self._mtimes = {}
+        self._hashes = {}
+        self._snapshot = (pd.DataFrame(columns=['Match'] + EVENT_COLUMNS), {})
+        self._aggregates = (None, None)
+        self._zone_index = (None, None)
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        with self._lock:
+            self.missing = []
+            if self.columnar_directory:
+                self._load_columnar()
+            else:
+                for key, filename in self.files.items():
+                    try:
+                        self._load_match(key, filename)
+                    except FileNotFoundError:
+                        self.missing.append(key)
+                self._rebuild()
+        for key in self.missing:
+            logger.warning("Match file for %s not found: %s", key, self.files[key])
+
+    def _load_match(self, key, filename):
+        mtime = os.stat(filename).st_mtime_ns
+        with open(filename, 'rb') as f:
+            raw = f.read()
+        self._frames[key] = read_events(io.BytesIO(raw), self.dictionaries)
+        self._hashes[key] = hashlib.sha1(raw).hexdigest()
+        self._mtimes[key] = mtime
+
+    def _load_columnar(self):
+        self._mtimes[None] = os.stat(os.path.join(self.columnar_directory, columnar.SCHEMA_FILE)).st_mtime_ns
+        events, schema = columnar.read_table(self.columnar_directory)
+        slices = {}
+        for key, (start, stop, digest) in schema['metadata']['matches'].items():
+            if key in self.files:
+                slices[key] = slice(start, stop)
+                self._hashes[key] = digest
+        self.missing = [key for key in self.files if key not in slices]
+        self._snapshot = (events, slices)
+
+    def _rebuild(self):
+        keys = [key for key in self.files if key in self._frames]
+        if not keys:
+            return
+        # Every match is brought up to the latest shared dictionaries, so the concatenated columns stay
+        # categorical and codes are comparable between games
+        dtypes = {column: self.dictionaries.dtype(column) for column in CATEGORY_COLUMNS}
+        frames = [self._frames[key].astype(dtypes) for key in keys]
+        events = pd.concat(frames, ignore_index=True)
+        match_dtype = self.dictionaries.dtype('Match', keys)
+        codes = np.repeat(match_dtype.categories.get_indexer(keys), [len(frame) for frame in frames])
+        events.insert(0, 'Match', pd.Categorical.from_codes(codes, dtype=match_dtype))
+
+        slices = {}
+        start = 0
+        for key, frame in zip(keys, frames):
+            slices[key] = slice(start, start + len(frame))
+            start += len(frame)
+        self._snapshot = (events, slices)
+        # Each match's frame becomes a view into the combined one rather than a second copy of its rows
+        self._frames = {key: events.iloc[rows, 1:] for key, rows in slices.items()}
+
+    def reload_if_changed(self, key=None):
+        if self.columnar_directory:
+            # The table is rewritten as a whole, so any change remaps every match
+            if self.refresh is not None:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    # A CSV caught halfway through being written; keep the current table and try again next time
+                    logger.warning("Could not refresh columnar events: %r", e)
+            try:
+                mtime = os.stat(os.path.join(self.columnar_directory, columnar.SCHEMA_FILE)).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if self._mtimes.get(None) == mtime:
+                return False
+            with self._lock:
+                self._load_columnar()
+            logger.info("Remapped columnar events from %s", self.columnar_directory)
+            return True
+
+        keys = [key] if key is not None else list(self.files)
+        changed = False
+        for key in keys:
+            filename = self.files.get(key)
+            if filename is None:
+                continue
+            try:
+                mtime = os.stat(filename).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self._mtimes.get(key) != mtime:
+                with self._lock:
+                    self._load_match(key, filename)
+                    if key in self.missing:
+                        self.missing.remove(key)
+                changed = True
+                logger.info("Reloaded match file for %s", key)
+        if changed:
+            with self._lock:
+                self._rebuild()
+        return changed
+
+    def __contains__(self, key):
+        return key in self._snapshot[1]
+
+    def keys(self):
+        return list(self._snapshot[1])
+
+    @property
+    def events(self):
+        return self._snapshot[0]
+
+    def aggregates(self):
+        # Built on first use for each snapshot, so a reload drops every cached aggregate with it
+        self.reload_if_changed()
+        snapshot = self._snapshot
+        with self._lock:
+            if self._aggregates[0] is not snapshot:
+                self._aggregates = (snapshot, EventAggregates(*snapshot))
+            return self._aggregates[1]
+
+    def zone_index(self):
+        # Origin and destination buckets for zone queries, rebuilt with each snapshot like the aggregates
+        self.reload_if_changed()
+        snapshot = self._snapshot
+        with self._lock:
+            if self._zone_index[0] is not snapshot:
+                self._zone_index = (snapshot, ZoneIndex(*snapshot))
+            return self._zone_index[1]
+
+    def data_hash(self, key):
+        return self._hashes.get(key)
+
+    def get(self, key):
+        self.reload_if_changed(key)
+        events, slices = self._snapshot
+        if key not in slices:
+            return events.iloc[0:0]
+        return events.iloc[slices[key]]
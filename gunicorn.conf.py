@@ -0,0 +1,24 @@
+import os
+
+
+# APP_PRELOAD=1 imports the app in the master and loads its data there, so forked workers share those pages
+preload_app = os.environ.get('APP_PRELOAD', '0') == '1'
+
+
+def when_ready(server):
+    if preload_app:
+        import main
+        main.preload()
+
+
+# Render pools split the host's cores between the workers (render_pool.default_pool_size); each pool starts on
+# the worker's first render, after this
+def post_fork(server, worker):
+    os.environ['WEB_WORKERS'] = str(server.cfg.workers)
+
+
+# Tables that SHARED_EVENTS=1 writes to /dev/shm outlive the processes mapping them; the master frees them on shutdown
+def on_exit(server):
+    if os.environ.get('SHARED_EVENTS') == '1' and not os.environ.get('COLUMNAR_DIR'):
+        import shared_events
+        shared_events.remove(os.environ.get('SHARED_EVENTS_NAME', 'qatar-events'))
@@ -0,0 +1,75 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from flask import abort, send_file
+
+
+logger = logging.getLogger(__name__)
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+# Rendered PNGs on disk under their SHA-256, served by the app at <prefix><digest>.png. A URL never changes
+# content, so browsers may keep it for a year and revalidate with the digest as a strong ETag. Every worker
+# shares the directory, so whichever worker rendered an image, any of them can serve it.
+class ImageStore:
+    def __init__(self, directory, prefix='/rendered/'):
+        self.directory = directory
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.png')
+
+    def put(self, png):
+        digest = hashlib.sha256(png).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent workers never serve a partial image
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(png)
+                os.replace(tmp_path, path)
+            except OSError:
+                logger.exception("Could not write rendered image %s", digest)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return self.prefix + digest + '.png'
+
+    def digest(self, url):
+        # None for anything that isn't one of our URLs, e.g. a data URI cached before images had routes
+        match = re.fullmatch(re.escape(self.prefix) + r'([0-9a-f]{64})\.png', url or '')
+        return match.group(1) if match else None
+
+    def contains(self, url):
+        digest = self.digest(url)
+        return digest is not None and os.path.exists(self._path(digest))
+
+    def read(self, url):
+        digest = self.digest(url)
+        if digest is None:
+            return None
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def init_app(self, server, route='/rendered/', endpoint='rendered_image'):
+        server.add_url_rule(route + '<digest>.png', endpoint, self.serve)
+
+    def serve(self, digest):
+        if not re.fullmatch(r'[0-9a-f]{64}', digest):
+            abort(404)
+        path = self._path(digest)
+        if not os.path.exists(path):
+            abort(404)
+        response = send_file(path, mimetype='image/png', etag=digest, max_age=ONE_YEAR, conditional=True)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
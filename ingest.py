@@ -0,0 +1,66 @@
+import argparse
+import hashlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+import columnar
+from data_files import PLAYER_EVENTS_FILE, game_options
+from event_store import EVENT_COLUMNS, read_events
+
+
+# Convert the match CSVs and the player event dataset into memory-mapped columnar tables, e.g.
+#   python ingest.py columnar && COLUMNAR_DIR=columnar gunicorn main:server
+def ingest_matches(files, directory):
+    frames = []
+    matches = {}
+    start = 0
+    for key, filename in files.items():
+        try:
+            with open(filename, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            print(f"Skipping {key}: {filename} not found", file=sys.stderr)
+            continue
+        frame = read_events(io.BytesIO(raw))
+        frames.append(frame.assign(Match=key))
+        # The CSV's hash is kept so render cache keys don't change with the storage format
+        matches[key] = [start, start + len(frame), hashlib.sha1(raw).hexdigest()]
+        start += len(frame)
+    events = pd.concat(frames, ignore_index=True)[['Match'] + EVENT_COLUMNS]
+    columnar.write_table(events, directory, metadata={'matches': matches})
+    return len(events)
+
+
+def ingest_players(filename, directory):
+    events = read_events(filename)
+    columnar.write_table(events, directory, metadata={'source': os.path.basename(filename)})
+    return len(events)
+
+
+def parse_match(value):
+    key, sep, filename = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=FILE, got {value!r}")
+    return key, filename
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write match and player events as columnar tables")
+    parser.add_argument('output', help="directory for the matches/ and players/ tables")
+    parser.add_argument('--match', type=parse_match, action='append', metavar='KEY=FILE',
+                        help="match file to include (default: every game in data_files.game_options)")
+    parser.add_argument('--players', default=PLAYER_EVENTS_FILE, help="player event dataset")
+    args = parser.parse_args()
+
+    files = dict(args.match) if args.match else game_options
+
+    start = time.perf_counter()
+    rows = ingest_matches(files, os.path.join(args.output, 'matches'))
+    print(f"matches: {rows} events in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    rows = ingest_players(args.players, os.path.join(args.output, 'players'))
+    print(f"players: {rows} events in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,139 @@
+import csv
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from density import cell_indices
+
+
+logger = logging.getLogger(__name__)
+
+# Same grid as create_heatmap / create_density_heatmap: 20 bins along the pitch (event X), 10 across (event Y)
+LIVE_BINS = (20, 10)
+
+
+# One match whose events arrive over time. Each event appends its coordinates and bumps one grid cell,
+# so keeping the positions and the heatmap counts current costs O(1) per event.
+class LiveMatch:
+    def __init__(self, key, capacity=1024):
+        self.key = key
+        self.length = 0
+        self._x = np.empty(capacity)
+        self._y = np.empty(capacity)
+        # Unsmoothed counts laid out like density_grid's statistic: row 0 is event Y = 0
+        self.counts = np.zeros((LIVE_BINS[1], LIVE_BINS[0]))
+        self._lock = threading.Lock()
+
+    def append(self, x, y):
+        with self._lock:
+            if self.length == len(self._x):
+                # Doubling keeps appends amortised O(1)
+                self._x = np.concatenate([self._x, np.empty(len(self._x))])
+                self._y = np.concatenate([self._y, np.empty(len(self._y))])
+            self._x[self.length] = x
+            self._y[self.length] = y
+            self.length += 1
+            # The same cell density_grid would put the event in, or -1 off the pitch
+            cell = cell_indices(x, y, LIVE_BINS)
+            if cell >= 0:
+                self.counts.flat[cell] += 1
+
+    def events_since(self, start):
+        # Coordinates appended after the first `start` events, and the new length
+        with self._lock:
+            return self._x[start:self.length].copy(), self._y[start:self.length].copy(), self.length
+
+    def grid(self):
+        with self._lock:
+            return self.counts.copy(), self.length
+
+
+# Follows LIVE_DIR/<match>.csv files as a feed appends to them (see replay.py). Every web worker runs its own
+# follower over the same files, so all of them see every event.
+class LiveFeed:
+    def __init__(self, directory, poll_interval=0.5):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.matches = {}
+        self._offsets = {}
+        self._headers = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+
+    def start(self):
+        # Threads don't survive a fork, so a preloaded master's follower is restarted in each worker
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Catch up before the first request is answered
+            self.poll()
+        threading.Thread(target=self._follow, name='live-feed', daemon=True).start()
+
+    def get(self, key):
+        self.start()
+        return self.matches.get(key)
+
+    def keys(self):
+        self.start()
+        return list(self.matches)
+
+    def _follow(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Live feed poll failed")
+            time.sleep(self.poll_interval)
+
+    def poll(self):
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return 0
+        appended = 0
+        with self._poll_lock:
+            for name in names:
+                if name.endswith('.csv'):
+                    appended += self._read_new_lines(name[:-len('.csv')], os.path.join(self.directory, name))
+        return appended
+
+    def _read_new_lines(self, key, path):
+        offset = self._offsets.get(key, 0)
+        if os.path.getsize(path) < offset:
+            # The file was truncated or replaced; start the match over
+            offset = 0
+            self._headers.pop(key, None)
+            self.matches.pop(key, None)
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        # Only complete lines; a partially written last line is picked up on the next poll
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        self._offsets[key] = offset + end
+        lines = data[:end].decode('utf-8').splitlines()
+        if key not in self._headers:
+            self._headers[key] = next(csv.reader(lines[:1]))
+            lines = lines[1:]
+        match = self.matches.get(key)
+        if match is None:
+            match = self.matches[key] = LiveMatch(key)
+        rows = 0
+        for row in csv.DictReader(lines, fieldnames=self._headers[key]):
+            match.append(parse_coordinate(row.get('X')), parse_coordinate(row.get('Y')))
+            rows += 1
+        return rows
+
+
+def parse_coordinate(value):
+    # Same missing-value handling as event_store.read_events
+    try:
+        return float(round(float(value)))
+    except (TypeError, ValueError):
+        return np.nan
@@ -1,30 +1,36 @@
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, Patch, ctx, no_update, DiskcacheManager
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-from urllib.request import urlopen
-from mplsoccer import Pitch, add_image
-from scipy.ndimage import gaussian_filter
+from _plotly_utils.utils import convert_to_base64
+from dash.exceptions import MissingCallbackContextException, PreventUpdate
 import base64
-import io
-from PIL import Image
-
-
-game_options = {
-    'ARG-AUS': 'ARG-AUS-round16.csv',
-    'ARG-CRO': 'ARG-CRO-semi-final.csv',
-    'ARG_FRA': 'the-final.csv',
-    'BRA-KOR': 'BRA-KOR-round16.csv',
-    'CRO-JPN': 'CRO-JPN-round16.csv',
-    'ENG-SEN': 'ENG-SEN-round16.csv',
-    'FRA-POL': 'FRA-POL-round16.csv',
-    'MAR-ESP': 'MAR-ESP-round16.csv',
-    'MAR-FRA': 'MAR-FRA-semi-final.csv',
-    'NED-USA': 'NED-USA-round16.csv',
-    'POR-SUI': 'POR-SUI-round16.csv',
-}
+import functools
+import logging
+import os
+import re
+import time
+
+import columnar
+import event_schema
+import shared_events
+from bundle import Bundle
+from compression import enable_compression
+from data_files import PLAYER_EVENTS_FILE, game_options
+from density import PITCH_EXTENT, bin_centers, cell_indices, density_grid, smooth
+from event_store import EventStore
+from image_store import ImageStore
+from live import LiveFeed
+from metrics import CallbackMetrics
+from player_assets import PlayerImageStore
+from player_index import PlayerIndex
+from render_cache import RenderCache, SingleFlight, file_hash, frame_hash, make_key
+from render_pool import BrokenProcessPool, RenderExecutor, RenderQueueFull, TimeoutError, run_renderer
+from shared_store import open_store
+from zones import ZONES, Zone
+
 
 player_images = {
     'Messi': 'https://www.national-football-teams.com/media/cache/players_page/uploads/person_photos'
@@ -43,91 +49,276 @@ player_images = {
               '/Neymar_39625-5b4be3cd9a349.jpeg',
     # Add other players here
 }
+default_player_image = 'https://img.a.transfermarkt.technology/portrait/header/28003-1710080339.jpg?lm=1'
+
+logging.basicConfig(level=logging.INFO)
+
+# Tables written by ingest.py; when set, events are memory-mapped from there instead of parsed from CSV
+columnar_dir = os.environ.get('COLUMNAR_DIR')
+
+# SHARED_EVENTS=1 maps the same tables from shared memory (/dev/shm/SHARED_EVENTS_NAME) instead. The first process
+# to start writes them, so all gunicorn workers map one copy rather than each parsing its own. A match CSV that
+# changes is written to the tables again by whichever worker notices first, and the others remap them.
+refresh_events = None
+if not columnar_dir and os.environ.get('SHARED_EVENTS') == '1':
+    shared_events_name = os.environ.get('SHARED_EVENTS_NAME', 'qatar-events')
+    refresh_events = functools.partial(shared_events.ensure, shared_events_name, game_options, PLAYER_EVENTS_FILE)
+    columnar_dir = refresh_events()
+
+# Match events are parsed once here; callbacks only slice the in-memory store
+match_events = EventStore(game_options,
+                          columnar_directory=os.path.join(columnar_dir, 'matches') if columnar_dir else None,
+                          refresh=refresh_events)
+
+# BACKGROUND_CALLBACKS=1 runs the player charts as Dash background callbacks, each job in its own process and
+# tracked in a diskcache under BACKGROUND_CALLBACK_DIR. A newer request from the same page kills the job it replaces.
+# Each job is forked from the web worker and can't use the worker's render pool, so it renders inline.
+class BackgroundJobManager(DiskcacheManager):
+    def call_job_fn(self, key, job_fn, args, context):
+        def run_job(*job_args):
+            render_executor.render_inline()
+            return job_fn(*job_args)
+        return super().call_job_fn(key, run_job, args, context)
+
+
+background_dir = os.environ.get('BACKGROUND_CALLBACK_DIR', 'background-jobs')
+background_manager = None
+if os.environ.get('BACKGROUND_CALLBACKS') == '1':
+    import diskcache
+    background_manager = BackgroundJobManager(diskcache.Cache(background_dir),
+                                              expire=int(os.environ.get('BACKGROUND_RESULT_TTL', 600)),
+                                              cache_by=[lambda: player_thumbnails.fingerprint()])
+
+# URLs of rendered images keyed on their inputs and source data. Behind each worker's LRU is a store all workers
+# share: files under RENDER_CACHE_DIR (render-cache/ by default, empty for none), or a Redis-protocol server at
+# RENDER_CACHE_URL=redis://host:port/db for several hosts. Background jobs only share results through the store,
+# so they get a directory of their own if RENDER_CACHE_DIR is empty.
+render_cache_dir = os.environ.get('RENDER_CACHE_DIR', 'render-cache') or (os.path.join(background_dir, 'renders')
+                                                                          if background_manager else None)
+# RENDER_CACHE_STATS_INTERVAL batches the fleet-wide hit and miss counters (seconds; 0 updates them on every lookup).
+renders = RenderCache(max_bytes=int(os.environ.get('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+                      store=open_store(os.environ.get('RENDER_CACHE_URL') or render_cache_dir),
+                      flush_interval=float(os.environ.get('RENDER_CACHE_STATS_INTERVAL', 0)))
+
+# Identical renders in flight at once are done once: per process, and across processes with a disk tier
+render_flights = SingleFlight(os.path.join(render_cache_dir, 'locks') if render_cache_dir else None)
+
+# Player photos are resolved once in the background; set PLAYER_IMAGE_OFFLINE_DIR to load them from disk instead
+player_thumbnails = PlayerImageStore(os.environ.get('PLAYER_IMAGE_DIR', 'player-images'),
+                                     offline_directory=os.environ.get('PLAYER_IMAGE_OFFLINE_DIR'))
+player_thumbnails.prefetch(list(player_images.values()) + [default_player_image])
+
+# Matplotlib renders run in a warm process pool; RENDER_POOL_SIZE=0 renders inline on the request thread. By default
+# each gunicorn worker gets its share of the host's cores.
+render_executor = RenderExecutor(int(os.environ['RENDER_POOL_SIZE']) if os.environ.get('RENDER_POOL_SIZE') else None,
+                                 max_pending=int(os.environ.get('RENDER_POOL_MAX_PENDING', 0)) or None,
+                                 timeout=float(os.environ.get('RENDER_TIMEOUT', 30)))
+
+# Game switches in the positions view send a Patch of the event points instead of the whole figure
+patch_updates = os.environ.get('PITCH_PATCH_UPDATES', '1') != '0'
+
+# The "All games" choice in the Games view aggregates over every match in the store
+ALL_GAMES = 'all'
+
+# The zone choice in the Games view for a shape drawn on the pitch, and the name drawn shapes are given
+DRAWN_ZONE = 'drawn'
+DRAWN_ZONE_SHAPE = 'drawn-zone'
+
+# Style of whichever of the Players view's image and graph isn't showing the selected chart
+hidden = {'display': 'none'}
+
+# Live matches are followed from LIVE_DIR/<match>.csv; open views poll every LIVE_REFRESH_MS for new events
+live_feed = LiveFeed(os.environ['LIVE_DIR']) if os.environ.get('LIVE_DIR') else None
+live_refresh_ms = int(os.environ.get('LIVE_REFRESH_MS', 2000))
+# A live match's PNG heatmap is drawn at most once every LIVE_HEATMAP_SECONDS; every view of it shares the image
+live_heatmap_seconds = float(os.environ.get('LIVE_HEATMAP_SECONDS', 10))
+live_heatmaps = {}
+live_heatmap_flights = SingleFlight()
+
+
+# The remaining datasets and figures load on first use, or up front in the gunicorn master with preload()
+@functools.lru_cache(maxsize=None)
+def get_player_data():
+    return pd.read_csv('player-stats.csv', encoding='unicode_escape')
+
+
+@functools.lru_cache(maxsize=None)
+def get_exp_data():
+    if columnar_dir:
+        return columnar.read_table(os.path.join(columnar_dir, 'players'))[0]
+    # Typed with the match events' dictionaries, so team and player names are held once per worker
+    return event_schema.read_csv(PLAYER_EVENTS_FILE, match_events.dictionaries)
+
+
+@functools.lru_cache(maxsize=None)
+def get_exp_index():
+    return PlayerIndex(get_exp_data())
+
+
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG],
+                background_callback_manager=background_manager)  # , suppress_callback_exceptions=True)
+server = app.server
+
+# Callback timings and response sizes at /metrics; PROFILE_SLOW_MS saves a cProfile dump of slower callbacks
+callback_metrics = CallbackMetrics(profile_slow_ms=float(os.environ.get('PROFILE_SLOW_MS', 0)) or None,
+                                   profile_dir=os.environ.get('PROFILE_DIR', 'profiles'))
+callback_metrics.init_app(server)
+# Render cache lookups of every worker sharing the store, so the fleet's hit rate is one scrape away
+callback_metrics.add_counter('render_cache_hits_total', "Render cache lookups that found an image",
+                             lambda: renders.stats()['hits'])
+callback_metrics.add_counter('render_cache_misses_total', "Render cache lookups that had to render",
+                             lambda: renders.stats()['misses'])
+# This worker's requests that waited on a render another of its threads had already started
+callback_metrics.add_counter('render_flights_coalesced_total', "Renders shared with a request already drawing them",
+                             lambda: render_flights.coalesced)
+
+# Rendered PNGs are served from /rendered/<sha256>.png with long-lived cache headers; callbacks return only the URL
+rendered_images = ImageStore(os.environ.get('RENDERED_IMAGE_DIR', 'rendered-images'),
+                             prefix=app.config.requests_pathname_prefix + 'rendered/')
+rendered_images.init_app(server, route=app.config.routes_pathname_prefix + 'rendered/')
+
+# Callback and layout JSON is gzip (or brotli) compressed; RESPONSE_COMPRESSION=0 leaves that to a proxy
+if os.environ.get('RESPONSE_COMPRESSION', '1') != '0':
+    enable_compression(server, level=int(os.environ.get('COMPRESSION_LEVEL', 6)))
+
+# BUNDLE_DIR serves images and figures from the latest bundle build_bundle.py wrote there, wherever their data
+# hasn't changed since; everything else is rendered live
+bundle = None
+if os.environ.get('BUNDLE_DIR'):
+    bundle = Bundle.open(os.environ['BUNDLE_DIR'], prefix=app.config.requests_pathname_prefix + 'bundle/')
+    if bundle is not None:
+        bundle.init_app(server, route=app.config.routes_pathname_prefix + 'bundle/')
+
+
+def get_live_match(selected_game):
+    if live_feed is None:
+        return None
+    return live_feed.get(selected_game)
 
-player_data = pd.read_csv('player-stats.csv', encoding='unicode_escape')
-exp_data = pd.read_csv('Expanded_Dataset_with_Additional_Players.csv')
 
+def get_match_events(selected_game):
+    with callback_metrics.span('load'):
+        if selected_game in match_events:
+            return match_events.get(selected_game)
+        return match_events.get('ARG-AUS')
+
+
+def process_event_data(df):
+    # The fixed pitch rather than each match's min/max, so the same event sits in the same place in every view
+    return scale_positions(*coordinates(df, 'X', 'Y'))
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG])  # , suppress_callback_exceptions=True)
-server = app.server
 
+def render(name, *args):
+    start = time.perf_counter()
+    try:
+        result, phases = render_executor.run(run_renderer, name, *args)
+    except (RenderQueueFull, TimeoutError, BrokenProcessPool) as e:
+        # Keep whatever the client is showing rather than failing the callback
+        logging.warning("Render %s skipped: %r", name, e)
+        raise PreventUpdate
+    callback_metrics.record('draw', phases.get('pitch', 0) + phases.get('plot', 0))
+    callback_metrics.record('encode', phases.get('encode', 0))
+    # Queueing for a pool process and shipping arguments and the image between processes
+    callback_metrics.record('render_wait', time.perf_counter() - start - sum(phases.values()))
+    return result
 
-def process_csv_data(filename):
-    df = pd.read_csv(filename)
-    x_values = df.iloc[:, 4]
-    y_values = df.iloc[:, 5]
 
-    min_x, max_x = x_values.min(), x_values.max()
-    min_y, max_y = y_values.min(), y_values.max()
+def bundled_figure(key):
+    return bundle.figure(key) if bundle is not None else None
 
-    x_scaled = (x_values - min_x) / (max_x - min_x)
-    y_scaled = 0.1 + 0.8 * (y_values - min_y) / (max_y - min_y)
 
-    return x_scaled, y_scaled
+def rendered_image(key, render_png):
+    # A bundled image was drawn from the same inputs and data, since those are what the key hashes
+    url = bundle.image_url(key) if bundle is not None else None
+    if url is not None:
+        return url
+    # The cache holds the image's URL; the PNG itself is in rendered_images, where every worker can serve it
+    url = renders.get(key, valid=servable)
+    if url is not None:
+        return url
+    return render_flights.do(key, lambda: render_and_store(key, render_png))
+
+
+def servable(url):
+    # A cached URL is only a hit if this host can serve its PNG. One another host rendered is copied from the
+    # shared store, where hosts sharing RENDER_CACHE_URL leave each PNG they draw.
+    if rendered_images.contains(url):
+        return True
+    digest = rendered_images.digest(url)
+    png = renders.get_image(digest) if digest else None
+    return png is not None and rendered_images.put(png) == url
+
+
+def render_and_store(key, render_png):
+    # Another thread or worker may have finished the same render while this one waited for it
+    url = renders.get(key, count=False, valid=servable)
+    if url is None:
+        png = render_png()
+        url = rendered_images.put(png)
+        renders.put(key, url)
+        renders.put_image(rendered_images.digest(url), png)
+    return url
 
 
 def create_heatmap(selected_game):
-    if selected_game in game_options:
-        filename = game_options[selected_game]
-        df = pd.read_csv(filename)
-        x_values = df.iloc[:, 5]
-        y_values = df.iloc[:, 4]
-
-        #  min_y, max_y = y_values.min(), y_values.max()
-        #  y_values = (y_values - min_y) / (max_y - min_y)
-        #  y_values = 1 - y_values
-    else:
-        df = pd.read_csv('ARG-AUS-round16.csv')
-        x_values = df.iloc[:, 5]
-        y_values = df.iloc[:, 4]
+    if selected_game not in match_events:
+        selected_game = 'ARG-AUS'
+    match_events.reload_if_changed(selected_game)
+    return rendered_image(heatmap_key(selected_game), lambda: render_game_heatmap(selected_game))
 
-    # Create the pitch
-    pitch = Pitch(pitch_type='wyscout',  # orientation='vertical',
-                  pitch_color='#22312b', line_color='#c7d5cc',
-                  stripe_color='#22312b', stripe_zorder=1)
-    fig, ax = pitch.draw(figsize=(10, 6))
 
-    # Calculate bin statistics
-    bin_statistic = pitch.bin_statistic(x_values, y_values, statistic='count', bins=(20, 10))
-    bin_statistic['statistic'] = gaussian_filter(bin_statistic['statistic'], 1)
+def heatmap_key(selected_game):
+    # The columns along and across the pitch are inputs too, so images drawn the other way round are never reused
+    return make_key('heatmap', selected_game, 'X', 'Y', match_events.data_hash(selected_game))
 
-    # Plot the heatmap
-    pcm = pitch.heatmap(bin_statistic, ax=ax, cmap='hot', edgecolors='#22312b')
 
-    # Add the colorbar
-    cbar = fig.colorbar(pcm, ax=ax, shrink=0.6)
-    cbar.outline.set_edgecolor('#efefef')
-    cbar.ax.yaxis.set_tick_params(color='#efefef')
-    plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='#efefef')
+def render_game_heatmap(selected_game):
+    # Event X runs along the pitch, as in every other Games view figure
+    return render('render_heatmap', *coordinates(get_match_events(selected_game), 'X', 'Y'))
 
-    # Save the figure to a BytesIO object
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    buf.seek(0)
 
-    img = Image.open(buf)
+def create_counts_heatmap(counts):
+    # Rendered from precomputed counts (filtered aggregates, zones); requests for the same grid share one render
+    key = make_key('counts_heatmap', counts.tobytes())
+    return rendered_image(key, lambda: render('render_heatmap', np.empty(0), np.empty(0), counts))
 
-    # Flip the image vertically
-    img = img.transpose(Image.FLIP_TOP_BOTTOM)
 
-    # Encode the flipped image
-    buf = io.BytesIO()
-    img.save(buf, format='png')
-    buf.seek(0)
+def create_heatmap_figure(image_data):
+    with callback_metrics.span('draw'):
+        return heatmap_figure(image_data)
 
-    encoded_image = base64.b64encode(buf.read()).decode('utf-8')
 
-    return f'data:image/png;base64,{encoded_image}'
+def heatmap_figure(image_data):
+    # Create a Plotly figure with an image trace
+    fig = go.Figure()
+    fig.add_layout_image(
+        dict(
+            source=image_data,
+            xref="x",
+            yref="y",
+            x=0,
+            y=1,
+            sizex=1,
+            sizey=1,
+            sizing="stretch",
+            opacity=1,
+            layer="below"
+        )
+    )
+    # Set the axis ranges
+    fig.update_xaxes(range=[0, 1], showticklabels=False)
+    fig.update_yaxes(range=[0, 1], showticklabels=False)
 
+    fig.update_layout(
+        plot_bgcolor='lightgray',
+        paper_bgcolor='lightgray'
+    )
+
+    return fig
 
-def create_soccer_pitch(selected_game):
-    if selected_game in game_options:
-        filename = game_options[selected_game]
-        x_scaled, y_scaled = process_csv_data(filename)
-    else:
-        x_scaled, y_scaled = process_csv_data('ARG-AUS-round16.csv')
 
-    fig = go.Figure(
+def create_pitch_layout():
+    return go.Figure(
         layout=dict(
             shapes=[
                 # Main rectangle
@@ -201,12 +392,43 @@ def create_soccer_pitch(selected_game):
             yaxis=dict(range=[0, 1], showgrid=False, showticklabels=False, fixedrange=True),
             plot_bgcolor='rgba(0,0,0,0)',
             paper_bgcolor='rgba(0,0,0,0)',
-            margin=dict(l=0, r=0, t=0, b=0)
+            margin=dict(l=0, r=0, t=0, b=0),
+            # Shapes drawn with the Games view's draw buttons become its zone. The buttons are only offered on
+            # figures in these axes, where drawn_zone_points can turn a shape back into event coordinates.
+            newshape=dict(name=DRAWN_ZONE_SHAPE, line=dict(color='yellow', width=2)),
+            modebar=dict(add=['drawrect', 'drawclosedpath', 'eraseshape'])
         )
-    ).add_trace(
-        go.Scatter(
-            x=y_scaled,
-            y=x_scaled,
+    ).to_plotly_json()['layout']
+
+
+# The pitch never changes, so its layout and centre-spot trace are validated and converted to plain
+# dicts once; every figure below shares them and only builds its own event trace
+pitch_layout = create_pitch_layout()
+density_pitch_layout = {**pitch_layout,
+                        'shapes': [{**pitch_layout['shapes'][0], 'fillcolor': 'rgba(0,0,0,0)'}] + pitch_layout['shapes'][1:]}
+centre_spots_trace = go.Scatter(
+    x=[0.185, 0.815],
+    y=[0.5, 0.5],
+    mode='markers',
+    marker=dict(
+        size=2,
+        color='darkgray',
+        symbol='circle'
+    ),
+    hoverinfo='none',
+    showlegend=False
+).to_plotly_json()
+
+
+def create_events_trace(selected_game):
+    return events_trace(*process_event_data(get_match_events(selected_game)))
+
+
+def events_trace(x_scaled, y_scaled):
+    with callback_metrics.span('draw'):
+        events_trace = go.Scatter(
+            x=x_scaled,
+            y=y_scaled,
             mode='markers',
             marker=dict(
                 size=27,  # Adjust the size as needed
@@ -214,13 +436,86 @@ def create_soccer_pitch(selected_game):
                 symbol='hexagon2-open-dot'
             ),
             showlegend=False
-        )
-    )
+        ).to_plotly_json()
+    # Same compact typed-array encoding go.Figure would send
+    with callback_metrics.span('encode'):
+        convert_to_base64(events_trace)
 
-    return fig
+    return events_trace
+
+
+def create_soccer_pitch(selected_game):
+    match_events.reload_if_changed(selected_game)
+    fig = bundled_figure(soccer_pitch_key(selected_game))
+    if fig is not None:
+        return fig
+    return dict(data=[create_events_trace(selected_game), centre_spots_trace], layout=pitch_layout)
+
+
+def soccer_pitch_key(selected_game):
+    return make_key('soccer_pitch', selected_game, 'X', 'Y', match_events.data_hash(selected_game))
+
+
+def create_density_heatmap(selected_game):
+    df = get_match_events(selected_game)
+
+    # Same 20x10 smoothed grid as create_heatmap, sent as a small matrix instead of a PNG
+    with callback_metrics.span('bin'):
+        statistic = density_grid(*coordinates(df, 'X', 'Y'), bins=(20, 10))
+
+    return dict(data=[density_trace(statistic)], layout=density_pitch_layout)
+
+
+def density_trace(statistic):
+    with callback_metrics.span('draw'):
+        heatmap_trace = go.Heatmap(
+            # Cell centres placed with scale_positions, so shapes drawn on it map back like those on the pitch
+            x=np.round(0.1 + 0.8 * bin_centers(20) / PITCH_EXTENT, 4),
+            y=np.round(1 - bin_centers(10) / PITCH_EXTENT, 4),
+            z=np.round(statistic, 3),
+            colorscale='Hot',
+            hoverinfo='z',
+            colorbar=dict(thickness=15, len=0.6)
+        ).to_plotly_json()
+    with callback_metrics.span('encode'):
+        convert_to_base64(heatmap_trace)
+
+    return heatmap_trace
+
+
+def create_live_figure(live_match, plot_type):
+    # The figure for everything received so far, and how many events that covers
+    if plot_type == 'positions':
+        x_values, y_values, count = live_match.events_since(0)
+        return dict(data=[events_trace(*scale_positions(x_values, y_values)), centre_spots_trace],
+                    layout=pitch_layout), count
+    if plot_type == 'density':
+        counts, count = live_match.grid()
+        return dict(data=[density_trace(smooth(counts))], layout=density_pitch_layout), count
+    image, count = live_heatmap(live_match)
+    return create_heatmap_figure(image), count
+
+
+def live_heatmap(live_match):
+    # The match's latest heatmap and the events it covers, drawn again only once LIVE_HEATMAP_SECONDS have passed.
+    # It is sent inline rather than through the image store and render cache, which would keep every frame for good.
+    latest = live_heatmaps.get(live_match.key)
+    if latest is not None and latest[1] <= live_match.length and (
+            latest[1] == live_match.length or time.monotonic() - latest[2] < live_heatmap_seconds):
+        return latest[:2]
+    return live_heatmap_flights.do(live_match.key, lambda: render_live_heatmap(live_match))
+
+
+def render_live_heatmap(live_match):
+    counts, count = live_match.grid()
+    png = render('render_heatmap', np.empty(0), np.empty(0), counts)
+    image = 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+    live_heatmaps[live_match.key] = (image, count, time.monotonic())
+    return image, count
 
 
 def create_player_stats_chart():
+    player_data = get_player_data()
     fig = go.Figure()  # Create a new figure object
 
     # Add bars to the figure
@@ -316,124 +611,208 @@ def create_team_stats_chart():
     return fig
 
 
+def player_thumbnail(player_image):
+    with callback_metrics.span('image'):
+        return player_thumbnails.get(player_image)
+
+
+def coordinates(data, *columns):
+    # CSV columns are int64 and columnar ones UInt8; renders take float arrays either way
+    return [data[column].to_numpy(dtype=float, na_value=np.nan) for column in columns]
+
+
+def player_chart_key(name, data, title, player_image):
+    return make_key(name, frame_hash(data), title, player_image, player_thumbnails.digest(player_image))
+
+
 def create_second_heatmap(data, title, player_image):
-    pitch = Pitch(pitch_type='wyscout', line_zorder=2, pitch_color='grass', line_color='white')
-    fig, ax = pitch.draw(figsize=(6.6, 4.125))
-    fig.set_facecolor('#22312b')
-    bin_statistic = pitch.bin_statistic(data['X'], data['Y'], statistic='count', bins=(25, 25))
-    bin_statistic['statistic'] = gaussian_filter(bin_statistic['statistic'], 1)
-    pcm = pitch.heatmap(bin_statistic, ax=ax, cmap='hot', edgecolors='#22312b')
-    # Add the colorbar
-    cbar = fig.colorbar(pcm, ax=ax, shrink=0.5)
-    cbar.outline.set_edgecolor('white')
-    cbar.ax.yaxis.set_tick_params(color='#efefef')
-    ticks = plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
-    player_image = Image.open(urlopen(player_image))
-    player_image = player_image.resize((100, 100))
-    add_image(player_image, fig, left=0.034, bottom=0.90, width=0.17, interpolation='hanning')
-    title = ax.set_title(title, color='white', fontsize=20)
-    return fig_to_html(fig)
+    key = player_chart_key('second_heatmap', data, title, player_image)
+    return rendered_image(key, lambda: render('render_second_heatmap',
+                                              *coordinates(data, 'X', 'Y'), title,
+                                              player_thumbnail(player_image)))
 
 
 def create_line_breaking_passes_chart(data, title, player_image):
-    pitch = Pitch(pitch_type='wyscout', pitch_color='grass', line_color='black', goal_type='box')
-    fig, ax = pitch.draw(figsize=(12, 8))
-    pitch.arrows(data['X'], data['Y'], data['X2'], data['Y2'], ax=ax, color='red', width=2, headwidth=3)
-    pitch.scatter(data['X2'], data['Y2'], s=70, facecolors='none', edgecolor='red', ax=ax)
-    player_image = Image.open(urlopen(player_image))
-    player_image = player_image.resize((100, 100))
-    add_image(player_image, fig, left=0.034, bottom=0.90, width=0.17, interpolation='hanning')
-    title = ax.set_title(title, color='black', fontsize=20)
-    return fig_to_html(fig)
-
-
-def fig_to_html(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=200, bbox_inches='tight')
-    buf.seek(0)
-    plt.close(fig)
-    encoded_image = base64.b64encode(buf.read()).decode('utf-8')
-    return f"data:image/png;base64,{encoded_image}"
-
-
-player_stats_fig = create_player_stats_chart()
-team_stats_fig = create_team_stats_chart()
-player_stats_fig.update_layout(
-    plot_bgcolor='lightgray',
-    paper_bgcolor='lightgray'
-)
-team_stats_fig.update_layout(
-    plot_bgcolor='lightgray',
-    paper_bgcolor='lightgray'
-)
+    key = player_chart_key('line_breaking_passes', data, title, player_image)
+    return rendered_image(key, lambda: render('render_line_breaking_passes_chart',
+                                              *coordinates(data, 'X', 'Y', 'X2', 'Y2'), title,
+                                              player_thumbnail(player_image)))
+
 
+def scale_positions(x_values, y_values):
+    # Wyscout coordinates onto pitch_layout: x along the pitch from 0.1 to 0.9, y down from the top as mplsoccer draws it
+    return 0.1 + 0.8 * x_values / PITCH_EXTENT, 1 - y_values / PITCH_EXTENT
 
-app.layout = html.Div([
-    html.H1("World Cup Qatar 2022 - Data-Driven Explorer", style={'textAlign': 'center'}),
-    dbc.Container([
-        dbc.Row([
-            dbc.Col([
-                dbc.Nav([
-                    dbc.NavLink("Games", href="/visualization", active="exact"),
-                    dbc.NavLink("Top Players", href="/page-2", active="exact"),
-                    dbc.NavLink("Team Performance", href="/page-3", active="exact"),
-                    dbc.NavLink("Specific Visualizations", href="/page-4", active="exact")
+
+@functools.lru_cache(maxsize=None)
+def thumbnail_url(player_image, digest):
+    # Plotly figures show the player's photo from the image store, like the renders; the digest keys this cache
+    if digest is None:
+        return None
+    with callback_metrics.span('image'):
+        with open(player_thumbnails.path(player_image), 'rb') as f:
+            return rendered_images.put(f.read())
+
+
+def create_line_breaking_passes_figure(data, title, player_image):
+    # The chances created chart drawn by Plotly: one line trace with an arrowhead per pass and a trace of end
+    # markers, so the response grows with the number of passes rather than with the pixels of the PNG
+    with callback_metrics.span('filter'):
+        x_values, y_values, x2_values, y2_values = coordinates(data, 'X', 'Y', 'X2', 'Y2')
+        x_start, y_start = scale_positions(x_values, y_values)
+        x_end, y_end = scale_positions(x2_values, y2_values)
+    with callback_metrics.span('draw'):
+        # Each pass is start, end, gap; the arrow marker on the end point is turned to face away from the start
+        gaps = np.full(len(x_start), np.nan)
+        passes_trace = go.Scatter(
+            x=np.round(np.column_stack([x_start, x_end, gaps]).ravel(), 4),
+            y=np.round(np.column_stack([y_start, y_end, gaps]).ravel(), 4),
+            mode='lines+markers',
+            line=dict(color='red', width=2),
+            marker=dict(symbol='arrow', angleref='previous', size=np.tile([0, 12, 0], len(x_start)), color='red'),
+            hoverinfo='skip',
+            showlegend=False
+        ).to_plotly_json()
+        ends_trace = go.Scatter(
+            x=np.round(x_end, 4),
+            y=np.round(y_end, 4),
+            mode='markers',
+            marker=dict(symbol='circle-open', size=14, color='red', line=dict(width=2)),
+            customdata=np.column_stack([x_values, y_values, x2_values, y2_values]),
+            hovertemplate='(%{customdata[0]}, %{customdata[1]}) to (%{customdata[2]}, %{customdata[3]})<extra></extra>',
+            showlegend=False
+        ).to_plotly_json()
+    with callback_metrics.span('encode'):
+        convert_to_base64(passes_trace)
+        convert_to_base64(ends_trace)
+
+    # Nothing is drawn on the Players view, so it doesn't get the Games view's draw buttons
+    layout = {**pitch_layout, 'title': dict(text=title, x=0.5), 'margin': dict(l=0, r=0, t=50, b=0), 'modebar': {}}
+    thumbnail = thumbnail_url(player_image, player_thumbnails.digest(player_image))
+    if thumbnail is not None:
+        layout['images'] = [dict(source=thumbnail, xref='paper', yref='paper', x=0, y=1, sizex=0.15, sizey=0.15,
+                                 xanchor='left', yanchor='top', layer='above')]
+    return dict(data=[passes_trace, ends_trace], layout=layout)
+
+
+@functools.lru_cache(maxsize=None)
+def get_player_stats_fig():
+    bundled = bundled_figure(player_stats_key())
+    if bundled is not None:
+        return bundled
+    player_stats_fig = create_player_stats_chart()
+    player_stats_fig.update_layout(
+        plot_bgcolor='lightgray',
+        paper_bgcolor='lightgray'
+    )
+    return player_stats_fig
+
+
+def player_stats_key():
+    return make_key('player_stats_fig', file_hash('player-stats.csv'))
+
+
+@functools.lru_cache(maxsize=None)
+def get_team_stats_fig():
+    bundled = bundled_figure(team_stats_key())
+    if bundled is not None:
+        return bundled
+    team_stats_fig = create_team_stats_chart()
+    team_stats_fig.update_layout(
+        plot_bgcolor='lightgray',
+        paper_bgcolor='lightgray'
+    )
+    return team_stats_fig
+
+
+def team_stats_key():
+    return make_key('team_stats_fig', file_hash('fifa-team-stats.csv'))
+
+
+@functools.lru_cache(maxsize=None)
+def get_top_player_image():
+    with open('Mbappe.png', 'rb') as f:
+        return rendered_images.put(f.read())
+
+
+# A function so the team list is read on the first page load rather than at import
+def serve_layout():
+    return html.Div([
+        html.H1("World Cup Qatar 2022 - Data-Driven Explorer", style={'textAlign': 'center'}),
+        dbc.Container([
+            dbc.Row([
+                dbc.Col([
+                    dbc.Nav([
+                        dbc.NavLink("Games", href="/visualization", active="exact"),
+                        dbc.NavLink("Top Players", href="/page-2", active="exact"),
+                        dbc.NavLink("Team Performance", href="/page-3", active="exact"),
+                        dbc.NavLink("Specific Visualizations", href="/page-4", active="exact")
+                    ],
+                        vertical=True,
+                        pills=True,
+                        style={"height": "100vh", "padding-top": "20px"},
+                    )
                 ],
-                    vertical=True,
-                    pills=True,
-                    style={"height": "100vh", "padding-top": "20px"},
-                )
-            ],
-                md=2,
-                className="border-end border-2 border-secondary"),
-            dbc.Col([
-                dcc.Location(id='url', refresh=False),
-                html.Div(id='page-content', children=[
-                    dcc.Dropdown(
-                        id='game-dropdown',
-                        options=[{'label': i, 'value': i} for i in game_options.keys()],
-                        value='ARG-AUS'
-                    ),
-                    dcc.Dropdown(
-                        id='plot-type-dropdown',
-                        options=[{'label': 'Event Positions', 'value': 'positions'},
-                                 {'label': 'Density Heatmap', 'value': 'heatmap'}],
-                        value='positions'
-                    ),
-                    # Add the new components here:
-                    dcc.Dropdown(
-                        id='team_dropdown',
-                        options=[{'label': team, 'value': team} for team in exp_data['Team'].unique()],
-                        placeholder="Select a Team"
-                    ),
-                    dcc.Dropdown(
-                        id='player_dropdown',
-                        placeholder="Select a Player"
-                    ),
-                    dcc.Dropdown(
-                        id='visualization_dropdown',
-                        options=[
-                            {'label': 'Heatmap', 'value': 'heatmap'},
-                            {'label': 'Chances Created', 'value': 'chances_created'},
-                        ],
-                        placeholder="Select Visualization Type"
-                    ),
-                    html.Img(id='visualization_img', style={'width': '100%', 'height': '100%'}),
-                    dcc.Graph(id='graph-container')  # If you need a separate graph for heatmap
-                ])
-            ], md=10)
+                    md=2,
+                    className="border-end border-2 border-secondary"),
+                dbc.Col([
+                    dcc.Location(id='url', refresh=False),
+                    html.Div(id='page-content', children=[
+                        dcc.Dropdown(
+                            id='game-dropdown',
+                            options=[{'label': i, 'value': i} for i in game_options.keys() if i in match_events],
+                            value='ARG-AUS'
+                        ),
+                        dcc.Dropdown(
+                            id='plot-type-dropdown',
+                            options=[{'label': 'Event Positions', 'value': 'positions'},
+                                     {'label': 'Density Heatmap', 'value': 'heatmap'},
+                                     {'label': 'Density Heatmap (interactive)', 'value': 'density'}],
+                            value='positions'
+                        ),
+                        # Add the new components here:
+                        dcc.Dropdown(
+                            id='team_dropdown',
+                            options=[{'label': team, 'value': team} for team in get_exp_index().teams],
+                            placeholder="Select a Team"
+                        ),
+                        dcc.Dropdown(
+                            id='player_dropdown',
+                            placeholder="Select a Player"
+                        ),
+                        dcc.Dropdown(
+                            id='visualization_dropdown',
+                            options=[
+                                {'label': 'Heatmap', 'value': 'heatmap'},
+                                {'label': 'Chances Created', 'value': 'chances_created'},
+                                {'label': 'Chances Created (interactive)', 'value': 'chances_created_vector'},
+                            ],
+                            placeholder="Select Visualization Type"
+                        ),
+                        html.Img(id='visualization_img', style={'width': '100%', 'height': '100%'}),
+                        dcc.Graph(id='visualization_graph', style=hidden),
+                        dcc.Graph(id='graph-container'),  # If you need a separate graph for heatmap
+                        # Placeholders for the Games view's controls, so every callback input is in the first layout
+                        dcc.Dropdown(id='team-filter', style=hidden),
+                        dcc.Dropdown(id='event-filter', style=hidden),
+                        dcc.Dropdown(id='type-filter', style=hidden),
+                        dcc.Interval(id='live-interval', interval=live_refresh_ms, disabled=True),
+                        dcc.Store(id='live-cursor'),
+                        dcc.Dropdown(id='zone-filter', style=hidden),
+                        dcc.Dropdown(id='zone-point', value='start', style=hidden),
+                        dcc.Store(id='drawn-zone')
+                    ])
+                ], md=10)
+            ])
         ])
     ])
-])
 
-with open('Mbappe.png', 'rb') as f:
-    top_player_image = base64.b64encode(f.read()).decode('utf-8')
-
-image_source = f'data:image/png;base64,{top_player_image}'
 
+app.layout = serve_layout
 
 @app.callback(Output('page-content', 'children'),
               Input('url', 'pathname'))
+@callback_metrics.timed
 def render_page_content(pathname):
     if pathname == '/':
         return html.Div([
@@ -445,28 +824,48 @@ def render_page_content(pathname):
             html.H4('Please select a tournament game', style={'textAlign': 'center'}),
             dcc.Dropdown(
                 id='game-dropdown',
-                options=[{'label': i, 'value': i} for i in game_options.keys()],
+                options=[{'label': 'All games', 'value': ALL_GAMES}] +
+                        [{'label': i, 'value': i} for i in game_options.keys() if i in match_events] +
+                        [{'label': f'{key} (live)', 'value': key} for key in (live_feed.keys() if live_feed else [])],
                 value='ARG-AUS'
             ),
             dcc.Dropdown(
                 id='plot-type-dropdown',
                 options=[{'label': 'Event Positions', 'value': 'positions'},
-                         {'label': 'Density Heatmap', 'value': 'heatmap'}],
+                         {'label': 'Density Heatmap', 'value': 'heatmap'},
+                         {'label': 'Density Heatmap (interactive)', 'value': 'density'},
+                         {'label': 'Player Totals', 'value': 'players'}],
                 value='positions'
             ),
-            dcc.Graph(id='graph-container')
+            dbc.Row([
+                dbc.Col(dcc.Dropdown(id=f'{column.lower()}-filter', placeholder=f'All {label}',
+                                     options=[{'label': value, 'value': value} for value in values]))
+                for column, label, values in filter_options()
+            ]),
+            dbc.Row([
+                dbc.Col(dcc.Dropdown(id='zone-filter', placeholder='Whole pitch (or draw a zone on it)',
+                                     options=[{'label': name, 'value': name} for name in ZONES] +
+                                             [{'label': 'Drawn on the pitch', 'value': DRAWN_ZONE}])),
+                dbc.Col(dcc.Dropdown(id='zone-point', clearable=False, value='start',
+                                     options=[{'label': 'Events starting in the zone', 'value': 'start'},
+                                              {'label': 'Events ending in the zone', 'value': 'end'}]))
+            ]),
+            dcc.Graph(id='graph-container'),
+            dcc.Store(id='drawn-zone'),
+            dcc.Interval(id='live-interval', interval=live_refresh_ms, disabled=True),
+            dcc.Store(id='live-cursor')
         ])
     elif pathname == "/page-2":
         return html.Div([
-            dcc.Graph(figure=player_stats_fig, style={'height': '82vh'}),
+            dcc.Graph(figure=get_player_stats_fig(), style={'height': '82vh'}),
             html.Hr(),
-            html.Img(src=image_source, style={'width': '700px', 'height': '365px',
+            html.Img(src=get_top_player_image(), style={'width': '700px', 'height': '365px',
                                               'display': 'block', 'margin': '0 auto'})
         ])
     elif pathname == "/page-3":
         return html.Div([
             dcc.Graph(
-                figure=team_stats_fig,
+                figure=get_team_stats_fig(),
                 style={'height': '550px'}  # Set the height to 800 pixels
             )
         ])
@@ -477,7 +876,7 @@ def render_page_content(pathname):
             # Dropdown to select the team
             dcc.Dropdown(
                 id='team_dropdown',
-                options=[{'label': team, 'value': team} for team in exp_data['Team'].unique()],
+                options=[{'label': team, 'value': team} for team in get_exp_index().teams],
                 placeholder="Select a Team"
             ),
 
@@ -493,35 +892,51 @@ def render_page_content(pathname):
                 options=[
                     {'label': 'Heatmap', 'value': 'heatmap'},
                     {'label': 'Chances Created', 'value': 'chances_created'},
-
+                    {'label': 'Chances Created (interactive)', 'value': 'chances_created_vector'},
                 ],
                 placeholder="Select Visualization Type"
             ),
 
             # Generate the image
-            html.Img(id='visualization_img', style={'width': '100%', 'height': '100%'})
+            html.Img(id='visualization_img', style={'width': '100%', 'height': '100%'}),
+            dcc.Graph(id='visualization_graph', style=hidden)
         ])
     else:
         return html.Div(['404 Not Found'])
 
 
-# Update the visualization based onn what is selected
+# Update the visualization based onn what is selected; PNG charts go to the image, Plotly ones to the graph
 @app.callback(
-    Output('visualization_img', 'src'),
+    [Output('visualization_img', 'src'), Output('visualization_graph', 'figure'),
+     Output('visualization_graph', 'style')],
     [Input('team_dropdown', 'value'),
      Input('player_dropdown', 'value'),
-     Input('visualization_dropdown', 'value')]
+     Input('visualization_dropdown', 'value')],
+    background=background_manager is not None,
+    interval=int(os.environ.get('BACKGROUND_POLL_MS', 250))
 )
+@callback_metrics.timed
 def update_visualization(selected_team, selected_player, visualization_type):
-    ind_player_data = exp_data[(exp_data['Team'] == selected_team) & (exp_data['Player'] == selected_player)]
-    player_image = player_images.get(selected_player,
-                                     'https://img.a.transfermarkt.technology/portrait/header/28003-1710080339.jpg?lm=1')
+    with callback_metrics.span('load'):
+        exp_index = get_exp_index()
+    with callback_metrics.span('filter'):
+        ind_player_data = exp_index.rows_for(selected_team, selected_player)
+    player_image = player_images.get(selected_player, default_player_image)
+    title = player_chart_title(selected_player, visualization_type)
     if visualization_type == 'heatmap':
-        return create_second_heatmap(ind_player_data, f"{selected_player}'s Heatmap", player_image)
+        return create_second_heatmap(ind_player_data, title, player_image), no_update, hidden
     elif visualization_type == 'chances_created':
-        return create_line_breaking_passes_chart(ind_player_data, f"{selected_player}'s Line-Breaking Passes", player_image)
+        return create_line_breaking_passes_chart(ind_player_data, title, player_image), no_update, hidden
+    elif visualization_type == 'chances_created_vector':
+        return None, create_line_breaking_passes_figure(ind_player_data, title, player_image), {'height': '80vh'}
     else:
-        return None
+        return None, no_update, hidden
+
+
+def player_chart_title(selected_player, visualization_type):
+    if visualization_type == 'heatmap':
+        return f"{selected_player}'s Heatmap"
+    return f"{selected_player}'s Line-Breaking Passes"
 
 
 # Update player options based on selected team
@@ -529,69 +944,336 @@ def update_visualization(selected_team, selected_player, visualization_type):
     Output('player_dropdown', 'options'),
     Input('team_dropdown', 'value')
 )
+@callback_metrics.timed
 def update_player_dropdown(selected_team):
     # The following will generate the player dropdown after the team is selected
     if selected_team:
-        players = exp_data[exp_data['Team'] == selected_team]['Player'].unique()
+        with callback_metrics.span('load'):
+            exp_index = get_exp_index()
+        with callback_metrics.span('filter'):
+            players = exp_index.players(selected_team)
         return [{'label': player, 'value': player} for player in players]
     return []
 
 
+def filter_options():
+    categories = match_events.aggregates().categories
+    return [('Team', 'teams', categories['Team']),
+            ('Event', 'events', categories['Event']),
+            ('Type', 'types', categories['Type'])]
+
+
+def triggered_id():
+    # None when a callback function is called directly rather than through a Dash request
+    try:
+        return ctx.triggered_id
+    except MissingCallbackContextException:
+        return None
+
+
 @app.callback(
-    Output('graph-container', 'figure'),
-    [Input('game-dropdown', 'value'), Input('plot-type-dropdown', 'value')])
-def update_graph(selected_game, plot_type):
-    if plot_type == 'positions':
-        fig = create_soccer_pitch(selected_game)
-        fig.add_trace(
-            go.Scatter(
-                x=[0.185, 0.815],
-                y=[0.5, 0.5],
-                mode='markers',
-                marker=dict(
-                    size=2,
-                    color='darkgray',
-                    symbol='circle'
-                ),
-                hoverinfo='none',
-                showlegend=False
-            )
-        )
+    [Output('graph-container', 'figure'), Output('live-cursor', 'data'), Output('live-interval', 'disabled')],
+    [Input('game-dropdown', 'value'), Input('plot-type-dropdown', 'value'),
+     Input('team-filter', 'value'), Input('event-filter', 'value'), Input('type-filter', 'value'),
+     Input('zone-filter', 'value'), Input('zone-point', 'value'), Input('drawn-zone', 'data')])
+@callback_metrics.timed
+def update_graph(selected_game, plot_type, team=None, event=None, event_type=None, zone=None, zone_point='start',
+                 drawn_zone=None):
+    live_match = get_live_match(selected_game)
+    if live_match is not None and plot_type in ('positions', 'heatmap', 'density'):
+        # The interval callback extends this figure with whatever arrives after `count`
+        fig, count = create_live_figure(live_match, plot_type)
+        return fig, {'game': selected_game, 'plot': plot_type, 'count': count}, False
+    editable = zone == DRAWN_ZONE
+    zone = get_zone(zone, drawn_zone)
+    if zone is not None:
+        return (create_zone_graph(selected_game, plot_type, zone, zone_point == 'end', team, event, event_type,
+                                  editable), None, True)
+    if selected_game == ALL_GAMES or plot_type == 'players' or any([team, event, event_type]):
+        return create_aggregate_graph(selected_game, plot_type, team, event, event_type), None, True
+    return create_graph(selected_game, plot_type), None, True
+
+
+def create_aggregate_graph(selected_game, plot_type, team, event, event_type):
+    # Served from the store's aggregates, so tournament-wide and filtered views never loop over matches
+    with callback_metrics.span('load'):
+        aggregates = match_events.aggregates()
+    match = None if selected_game == ALL_GAMES else selected_game
+    # A cleared dropdown (None) falls back like create_graph does, rather than meaning every game
+    if selected_game != ALL_GAMES and match not in match_events:
+        match = 'ARG-AUS'
 
-        return fig
+    if plot_type == 'positions':
+        df = match_events.events if match is None else get_match_events(match)
+        with callback_metrics.span('filter'):
+            mask = np.ones(len(df), dtype=bool)
+            for column, value in [('Team', team), ('Event', event), ('Type', event_type)]:
+                if value is not None:
+                    mask &= (df[column] == value).fillna(False).to_numpy()
+        if not mask.any():
+            return dict(data=[events_trace(np.empty(0), np.empty(0)), centre_spots_trace], layout=pitch_layout)
+        return dict(data=[events_trace(*process_event_data(df[mask])), centre_spots_trace], layout=pitch_layout)
 
     elif plot_type == 'heatmap':
-        image_data = create_heatmap(selected_game)
+        with callback_metrics.span('filter'):
+            counts = aggregates.grid(match, team, event, event_type)
+        return create_heatmap_figure(create_counts_heatmap(counts))
+
+    elif plot_type == 'density':
+        with callback_metrics.span('filter'):
+            statistic = smooth(aggregates.grid(match, team, event, event_type))
+        return dict(data=[density_trace(statistic)], layout=density_pitch_layout)
+
+    elif plot_type == 'players':
+        with callback_metrics.span('filter'):
+            totals = aggregates.player_totals(match, team, event, event_type)
+        return player_totals_figure(totals)
+    else:
+        return html.Div('Invalid plot type')
 
-        # Create a Plotly figure with an image trace
-        fig = go.Figure()
-        fig.add_layout_image(
-            dict(
-                source=image_data,
-                xref="x",
-                yref="y",
-                x=0,
-                y=1,
-                sizex=1,
-                sizey=1,
-                sizing="stretch",
-                opacity=1,
-                layer="below"
-            )
-        )
-        # Set the axis ranges
-        fig.update_xaxes(range=[0, 1], showticklabels=False)
-        fig.update_yaxes(range=[0, 1], showticklabels=False)
 
-        fig.update_layout(
-            plot_bgcolor='lightgray',
-            paper_bgcolor='lightgray'
-        )
+def player_totals_figure(totals):
+    # The 20 busiest of [(team, player, events)], busiest at the top
+    totals = totals[:20][::-1]
+    fig = go.Figure(go.Bar(
+        x=[count for _, _, count in totals],
+        y=[f'{player} ({player_team})' for player_team, player, _ in totals],
+        orientation='h',
+        text=[count for _, _, count in totals],
+        textposition='auto'
+    ))
+    fig.update_layout(
+        xaxis={'title': 'Events'},
+        plot_bgcolor='lightgray',
+        paper_bgcolor='lightgray',
+        height=600
+    )
+    return fig
 
-        return fig
+
+def get_zone(zone, drawn_zone):
+    if zone == DRAWN_ZONE:
+        return Zone(drawn_zone) if drawn_zone else None
+    return ZONES.get(zone)
+
+
+def zone_shapes(zone, editable=False):
+    # The zone outlined on pitch_layout, below the event markers. A drawn zone stays an editable shape on top, so
+    # it can be dragged, reshaped or erased.
+    shapes = []
+    for polygon in zone.polygons:
+        x_values, y_values = scale_positions(*np.array(polygon).T)
+        path = 'M' + 'L'.join(f'{x:.4f},{y:.4f}' for x, y in zip(x_values, y_values)) + 'Z'
+        shape = dict(type='path', path=path, line=dict(color='yellow', width=2),
+                     fillcolor='rgba(255, 255, 0, 0.2)', layer='below')
+        if editable:
+            shape.update(name=DRAWN_ZONE_SHAPE, editable=True, layer='above')
+        shapes.append(shape)
+    return shapes
+
+
+def create_zone_graph(selected_game, plot_type, zone, end, team, event, event_type, editable=False):
+    # Events starting (or ending) in a zone, looked up in the store's zone index rather than scanned
+    with callback_metrics.span('load'):
+        index = match_events.zone_index()
+    match = None if selected_game == ALL_GAMES else selected_game
+    if selected_game != ALL_GAMES and match not in index.slices:
+        match = 'ARG-AUS'
+    with callback_metrics.span('filter'):
+        rows = index.rows(zone, end=end, match=match, team=team, event=event, type=event_type)
+        matched = index.events.iloc[np.sort(rows)]
+
+    if plot_type == 'positions':
+        everything = index.events if match is None else index.events.iloc[index.slices[match]]
+        return zone_positions_figure(everything, matched, zone, end, editable)
+
+    elif plot_type in ('heatmap', 'density'):
+        # Where the matching events start, or end when that is what the zone matched, on the aggregates' grid
+        with callback_metrics.span('bin'):
+            cells = cell_indices(*coordinates(matched, *(('X2', 'Y2') if end else ('X', 'Y'))), (20, 10))
+            counts = np.bincount(cells[cells >= 0], minlength=200).reshape(10, 20).astype(float)
+        if plot_type == 'density':
+            return dict(data=[density_trace(smooth(counts))], layout=density_pitch_layout)
+        return create_heatmap_figure(create_counts_heatmap(counts))
+
+    elif plot_type == 'players':
+        with callback_metrics.span('filter'):
+            totals = matched.groupby(['Team', 'Player'], observed=True).size().sort_values(ascending=False, kind='stable')
+        return player_totals_figure([(player_team, player, int(count)) for (player_team, player), count in totals.items()])
+    else:
+        return html.Div('Invalid plot type')
+
+
+def zone_positions_figure(everything, matched, zone, end, editable=False):
+    # Every event at the zone's end of it in grey, the matching ones highlighted with a line to their other end
+    point, other = (['X2', 'Y2'], ['X', 'Y']) if end else (['X', 'Y'], ['X2', 'Y2'])
+    with callback_metrics.span('draw'):
+        x_all, y_all = scale_positions(*coordinates(everything, *point))
+        x_points, y_points = scale_positions(*coordinates(matched, *point))
+        x_others, y_others = scale_positions(*coordinates(matched, *other))
+        gaps = np.full(len(x_points), np.nan)
+        all_trace = go.Scatter(x=np.round(x_all, 4), y=np.round(y_all, 4), mode='markers',
+                               marker=dict(size=6, color='gray'), hoverinfo='skip', showlegend=False).to_plotly_json()
+        lines_trace = go.Scatter(x=np.round(np.column_stack([x_points, x_others, gaps]).ravel(), 4),
+                                 y=np.round(np.column_stack([y_points, y_others, gaps]).ravel(), 4),
+                                 mode='lines', line=dict(color='orange', width=1), hoverinfo='skip',
+                                 showlegend=False).to_plotly_json()
+        matched_trace = go.Scatter(
+            x=np.round(x_points, 4),
+            y=np.round(y_points, 4),
+            mode='markers',
+            marker=dict(size=10, color='orange', line=dict(color='black', width=1)),
+            customdata=np.column_stack([matched[column].astype(object).fillna('').to_numpy()
+                                        for column in ['Player', 'Team', 'Event', 'Type']]),
+            hovertemplate='%{customdata[0]} (%{customdata[1]}) %{customdata[2]} %{customdata[3]}<extra></extra>',
+            showlegend=False
+        ).to_plotly_json()
+    with callback_metrics.span('encode'):
+        for trace in (all_trace, lines_trace, matched_trace):
+            convert_to_base64(trace)
+    layout = {**pitch_layout, 'shapes': pitch_layout['shapes'] + zone_shapes(zone, editable),
+              'title': dict(text=f"{len(matched)} events {'ending' if end else 'starting'} in the zone", x=0.5),
+              'margin': dict(l=0, r=0, t=40, b=0)}
+    return dict(data=[all_trace, lines_trace, matched_trace, centre_spots_trace], layout=layout)
+
+
+def drawn_zone_points(shape):
+    # A rectangle or closed path drawn on pitch_layout, as points in event coordinates: scale_positions inverted
+    if shape.get('type') == 'rect':
+        corners = [(shape['x0'], shape['y0']), (shape['x1'], shape['y0']), (shape['x1'], shape['y1']),
+                   (shape['x0'], shape['y1'])]
+    elif shape.get('type') == 'path':
+        corners = [tuple(map(float, pair)) for pair in re.findall(r'([-\d.eE]+),([-\d.eE]+)', shape['path'])]
+    else:
+        return None
+    if len(corners) < 3:
+        return None
+    x_values, y_values = np.array(corners, dtype=float).T
+    return np.round(np.column_stack([(x_values - 0.1) / 0.8 * PITCH_EXTENT, (1 - y_values) * PITCH_EXTENT]), 2).tolist()
+
+
+def edited_zone_shape(relayout_data):
+    # Plotly reports an edit to a shape as 'shapes[i].path', or 'shapes[i].x0' ... 'shapes[i].y1' for a rectangle
+    edits = {}
+    for key, value in relayout_data.items():
+        match = re.fullmatch(r'shapes\[\d+\]\.(x0|y0|x1|y1|path)', key)
+        if match:
+            edits[match.group(1)] = value
+    if 'path' in edits:
+        return dict(type='path', path=edits['path'])
+    if len(edits) == 4:
+        return dict(type='rect', **edits)
+    return None
+
+
+# A shape drawn on the Games view's pitch becomes the zone; erasing it goes back to the whole pitch
+@app.callback(
+    [Output('drawn-zone', 'data'), Output('zone-filter', 'value')],
+    Input('graph-container', 'relayoutData'),
+    State('zone-filter', 'value'),
+    prevent_initial_call=True)
+@callback_metrics.timed
+def update_drawn_zone(relayout_data, zone):
+    if not relayout_data:
+        raise PreventUpdate
+    if 'shapes' in relayout_data:
+        drawn = [shape for shape in relayout_data['shapes']
+                 if shape.get('name') == DRAWN_ZONE_SHAPE or shape.get('editable')]
+        if not drawn:
+            return None, None if zone == DRAWN_ZONE else no_update
+        shape = drawn[-1]
+    else:
+        # Only drawn shapes are editable, so an edited shape is the drawn zone being moved or reshaped
+        shape = edited_zone_shape(relayout_data)
+        if shape is None:
+            raise PreventUpdate
+    points = drawn_zone_points(shape)
+    if points is None:
+        raise PreventUpdate
+    return points, DRAWN_ZONE
+
+
+def create_graph(selected_game, plot_type):
+    if plot_type == 'positions':
+        if patch_updates and triggered_id() == 'game-dropdown':
+            # The graph already shows the pitch for this plot type; only the event points change
+            events_trace = create_events_trace(selected_game)
+            fig = Patch()
+            fig['data'][0]['x'] = events_trace['x']
+            fig['data'][0]['y'] = events_trace['y']
+            return fig
+
+        return create_soccer_pitch(selected_game)
+
+    elif plot_type == 'heatmap':
+        return create_heatmap_figure(create_heatmap(selected_game))
+
+    elif plot_type == 'density':
+        return create_density_heatmap(selected_game)
     else:
         return html.Div('Invalid plot type')
 
 
+@app.callback(
+    [Output('graph-container', 'extendData'), Output('graph-container', 'figure', allow_duplicate=True),
+     Output('live-cursor', 'data', allow_duplicate=True)],
+    Input('live-interval', 'n_intervals'),
+    State('live-cursor', 'data'),
+    prevent_initial_call=True)
+@callback_metrics.timed
+def update_live_graph(n_intervals, cursor):
+    # Sends only what changed since the client's cursor: new points, or the grid behind the heatmap
+    live_match = get_live_match(cursor['game']) if cursor else None
+    if live_match is None or live_match.length == cursor['count']:
+        raise PreventUpdate
+    if live_match.length < cursor['count']:
+        # The feed restarted the match
+        fig, count = create_live_figure(live_match, cursor['plot'])
+        return no_update, fig, {**cursor, 'count': count}
+
+    if cursor['plot'] == 'positions':
+        x_values, y_values, count = live_match.events_since(cursor['count'])
+        x_scaled, y_scaled = scale_positions(x_values, y_values)
+        return [dict(x=[x_scaled], y=[y_scaled]), [0]], no_update, {**cursor, 'count': count}
+
+    fig = Patch()
+    if cursor['plot'] == 'density':
+        counts, count = live_match.grid()
+        fig['data'][0]['z'] = np.round(smooth(counts), 3)
+    else:
+        image, count = live_heatmap(live_match)
+        if count == cursor['count']:
+            # Not due for another render yet; the cursor stays put, so a later poll picks the new events up
+            raise PreventUpdate
+        fig['layout']['images'][0]['source'] = image
+    return no_update, fig, {**cursor, 'count': count}
+
+
+def preload():
+    # Called in the gunicorn master (APP_PRELOAD=1) so forked workers share the loaded data and libraries
+    get_exp_index()
+    match_events.zone_index()
+    get_player_stats_fig()
+    get_team_stats_fig()
+    get_top_player_image()
+    import renderers
+    renderers.warm_up()
+
+
+def warm_render_cache():
+    # Pre-render every game heatmap and every player visualization before serving
+    player_thumbnails.wait()
+    count = 0
+    for selected_game in match_events.keys():
+        create_heatmap(selected_game)
+        count += 1
+    for selected_team in get_exp_index().teams:
+        for player in update_player_dropdown(selected_team):
+            for visualization_type in ['heatmap', 'chances_created']:
+                update_visualization(selected_team, player['value'], visualization_type)
+                count += 1
+    return count
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,138 @@
+import cProfile
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, request
+
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        # Prometheus text format; bucket counts are cumulative as the format expects
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in key)
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+# Wall time of every Dash callback, split into phases (load, filter, draw, encode, serialize, ...) and response
+# sizes, served from /metrics. With profile_slow_ms set, callbacks run under cProfile and any that take
+# longer than that leave a .prof file in profile_dir.
+class CallbackMetrics:
+    def __init__(self, profile_slow_ms=None, profile_dir='profiles'):
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_dir = profile_dir
+        self.callback_seconds = Histogram('dash_callback_duration_seconds', "Wall time of a Dash callback",
+                                          SECONDS_BUCKETS)
+        self.phase_seconds = Histogram('dash_callback_phase_seconds', "Time spent in each phase of a callback",
+                                       SECONDS_BUCKETS)
+        self.response_bytes = Histogram('dash_callback_response_bytes', "Size of a callback's JSON response",
+                                        BYTES_BUCKETS)
+        self._counters = []
+        self._current = threading.local()
+
+    def init_app(self, server):
+        server.after_request(self._after_request)
+        server.add_url_rule('/metrics', 'metrics', self.expose)
+
+    def add_counter(self, name, description, read):
+        # Exposed as a counter whose value read() returns at scrape time
+        self._counters.append((name, description, read))
+
+    @contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def record(self, phase, seconds):
+        callback = getattr(self._current, 'callback', None) or 'none'
+        self.phase_seconds.observe(seconds, callback=callback, phase=phase)
+
+    def timed(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._current, 'callback', None)
+            self._current.callback = fn.__name__
+            # Only the outermost callback is profiled; a thread can't run two profilers
+            profiler = cProfile.Profile() if self.profile_slow_ms and previous is None else None
+            start = time.perf_counter()
+            try:
+                if profiler is not None:
+                    profiler.enable()
+                return fn(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                finished = time.perf_counter()
+                self.callback_seconds.observe(finished - start, callback=fn.__name__)
+                self._current.callback = previous
+                # Dash serializes the return value after this; _after_request times that part
+                self._current.finished = (fn.__name__, finished)
+                if profiler is not None and (finished - start) * 1000 >= self.profile_slow_ms:
+                    self._dump_profile(profiler, fn.__name__, finished - start)
+
+        return wrapper
+
+    def _dump_profile(self, profiler, callback, seconds):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f'{callback}-{int(time.time() * 1000)}-{os.getpid()}'
+                                              f'-{threading.get_ident()}.prof')
+        profiler.dump_stats(path)
+        logger.warning("Slow callback %s took %.0f ms; profile written to %s", callback, seconds * 1000, path)
+
+    def _after_request(self, response):
+        finished = getattr(self._current, 'finished', None)
+        self._current.finished = None
+        if finished is None or not request.path.endswith('_dash-update-component'):
+            return response
+        callback, callback_end = finished
+        self.phase_seconds.observe(time.perf_counter() - callback_end, callback=callback, phase='serialize')
+        if not response.direct_passthrough:
+            self.response_bytes.observe(len(response.get_data()), callback=callback)
+        return response
+
+    def expose(self):
+        lines = []
+        for histogram in [self.callback_seconds, self.phase_seconds, self.response_bytes]:
+            lines.extend(histogram.expose())
+        for name, description, read in self._counters:
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} counter', f'{name} {read()}'])
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
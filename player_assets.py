@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (100, 100)
+
+
+# Player photos are fetched once, resized and kept on disk and in memory; renders never touch the network.
+# A photo that couldn't be fetched is tried again in the background, at most once every retry_after seconds.
+class PlayerImageStore:
+    def __init__(self, directory, offline_directory=None, max_workers=4, timeout=10, retry_after=300):
+        self.directory = directory
+        self.offline_directory = offline_directory
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._thumbnails = {}
+        self._digests = {}
+        self._failed = {}
+        self._futures = []
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.png')
+
+    def prefetch(self, urls):
+        # Bounded pool so a slow image host can't hold more than max_workers connections
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='player-image')
+        futures = [executor.submit(self.fetch, url) for url in dict.fromkeys(urls)]
+        executor.shutdown(wait=False)
+        with self._lock:
+            self._futures.extend(futures)
+        return futures
+
+    def wait(self):
+        with self._lock:
+            futures = list(self._futures)
+        # Bounded, because fetches started before a fork never finish in the child
+        wait(futures, timeout=self.timeout * (len(futures) // self.max_workers + 1))
+
+    def fetch(self, url):
+        from PIL import Image
+
+        if self._load(url):
+            return True
+        try:
+            if self.offline_directory:
+                source = os.path.join(self.offline_directory, os.path.basename(urlparse(url).path))
+                image = Image.open(source)
+            else:
+                with urlopen(url, timeout=self.timeout) as response:
+                    image = Image.open(response)
+                    image.load()
+            # Write then rename, as every worker fetches on startup and may be reading the same file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.png')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    image.resize(THUMBNAIL_SIZE).save(f, format='png')
+                os.replace(tmp_path, self.path(url))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning("Could not fetch player image %s: %s", url, e)
+            with self._lock:
+                self._failed[url] = time.monotonic()
+            return False
+        with self._lock:
+            self._failed.pop(url, None)
+        return self._load(url)
+
+    def _load(self, url):
+        from PIL import Image
+
+        path = self.path(url)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            image = Image.open(path)
+            image.load()
+        except Exception as e:
+            logger.warning("Could not read player image %s: %s", path, e)
+            return False
+        with self._lock:
+            self._thumbnails[url] = image
+            self._digests[url] = digest
+        return True
+
+    def get(self, url):
+        with self._lock:
+            image = self._thumbnails.get(url)
+        if image is None:
+            if not self._load(url):
+                self._retry(url)
+                return None
+            with self._lock:
+                image = self._thumbnails.get(url)
+        return image
+
+    def _retry(self, url):
+        # The caller goes on without the photo; renders pick it up once it has loaded, as its digest is in their keys
+        with self._lock:
+            failed = self._failed.get(url)
+            if failed is None or time.monotonic() - failed < self.retry_after:
+                return
+            self._failed[url] = time.monotonic()
+        self.prefetch([url])
+
+    def digest(self, url):
+        with self._lock:
+            return self._digests.get(url)
+
+    def fingerprint(self):
+        # Changes whenever a photo finishes loading, for caches of anything drawn with them
+        with self._lock:
+            digests = sorted(self._digests.items())
+        return hashlib.sha1(repr(digests).encode('utf-8')).hexdigest()
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+
+# Rows grouped by (Team, Player) once at load time so callbacks slice instead of scanning
+class PlayerIndex:
+    def __init__(self, df):
+        team_codes, teams = pd.factorize(df['Team'], sort=True)
+        player_codes, players = pd.factorize(df['Player'], sort=True)
+        group_codes = team_codes.astype(np.int64) * len(players) + player_codes
+        # factorize codes a missing team or player as -1; those rows belong to no one, as with df['Team'] == team
+        keep = np.flatnonzero((team_codes >= 0) & (player_codes >= 0))
+
+        # Stable sort keeps each player's rows in their original order
+        order = keep[np.argsort(group_codes[keep], kind='stable')]
+        self.rows = df.iloc[order].reset_index(drop=True)
+        sorted_codes = group_codes[order]
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1) != 0)
+        stops = np.r_[starts[1:], len(sorted_codes)]
+
+        self.teams = list(pd.unique(df['Team'].iloc[keep]))
+        self._slices = {}
+        self._players = {}
+        for start, stop in zip(starts, stops):
+            team = teams[team_codes[order[start]]]
+            player = players[player_codes[order[start]]]
+            self._slices[(team, player)] = slice(int(start), int(stop))
+            self._players.setdefault(team, []).append(player)
+
+    def players(self, team):
+        return self._players.get(team, [])
+
+    def rows_for(self, team, player):
+        rows = self._slices.get((team, player))
+        if rows is None:
+            return self.rows.iloc[0:0]
+        return self.rows.iloc[rows]
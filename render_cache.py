@@ -0,0 +1,212 @@
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from shared_store import StoreError
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts):
+    # Content address: the render function's inputs plus the hash of the data it reads
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+def frame_hash(df):
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+def file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# URLs of rendered images in a per-process LRU, in front of an optional shared store (shared_store.FileStore or
+# RespStore) that every worker reads. Hits and misses are added to counters in the store, so stats() gives the
+# hit rate of the whole fleet; flush_interval batches those updates. A store that fails counts as a miss.
+class RenderCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, store=None, flush_interval=0):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._unflushed = [0, 0]
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, key, count=True, valid=None):
+        # count=False for a second look at a key that was already counted, e.g. after waiting on another render.
+        # valid, if given, says whether a value found can be used, e.g. whether its image can be served here;
+        # one that can't is a miss.
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        stored = value is None
+        if stored:
+            value = self._store_call('get', key)
+        if value is not None and valid is not None and not valid(value):
+            value = None
+        if count:
+            with self._lock:
+                self._count(hit=value is not None)
+            self._flush_counts()
+        if stored and value is not None:
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+        self._store_call('set', key, value)
+
+    def put_image(self, digest, png):
+        # Only a store other hosts read needs the image itself; on one host every worker reads the image directory
+        if getattr(self.store, 'remote', False):
+            self._store_call('set', 'image:' + digest, png)
+
+    def get_image(self, digest):
+        if not getattr(self.store, 'remote', False):
+            return None
+        return self._store_call('get_bytes', 'image:' + digest)
+
+    def stats(self):
+        # Counts across every process sharing the store, or this process's own without one
+        if self.store is None:
+            return {'hits': self.hits, 'misses': self.misses}
+        self._flush_counts(force=True)
+        try:
+            return {'hits': self.store.counter('hits'), 'misses': self.store.counter('misses')}
+        except (OSError, StoreError) as e:
+            logger.warning("Render cache store unavailable: %s", e)
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._unflushed[0 if hit else 1] += 1
+
+    def _flush_counts(self, force=False):
+        if self.store is None:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._flushed_at < self.flush_interval:
+                return
+            hits, misses = self._unflushed
+            self._unflushed = [0, 0]
+            self._flushed_at = time.monotonic()
+        if hits:
+            self._store_call('incr', 'hits', hits)
+        if misses:
+            self._store_call('incr', 'misses', misses)
+
+    def _store_call(self, method, *args):
+        if self.store is None:
+            return None
+        try:
+            return getattr(self.store, method)(*args)
+        except (OSError, StoreError) as e:
+            logger.warning("Render cache store unavailable for %s: %s", method, e)
+            return None
+
+    def _remember(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+# Identical renders requested at the same time are done once. Threads of one process wait on the first caller's
+# future. With a directory, that caller also holds an flock on <directory>/<key>, so other workers and background
+# jobs wait for it and then find its result in the shared cache; if it dies, the kernel drops the lock and the
+# next waiter renders instead.
+class SingleFlight:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def do(self, key, fn):
+        if os.getpid() != self._pid:
+            # Calls that were in flight when this process was forked never finish here
+            self._calls = {}
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            with self._file_lock(key):
+                result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def _file_lock(self, key):
+        if not self.directory:
+            return _NoLock()
+        return _FileLock(os.path.join(self.directory, key))
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        # Unlinking first can let a process that opened the old file and one that creates a new file both
+        # proceed; that costs a duplicate render, never a wrong result
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        return False
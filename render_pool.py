@@ -0,0 +1,153 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+def run_renderer(name, *args):
+    # renderers pulls in matplotlib and mplsoccer, so it is only imported by the process that draws.
+    # Phase timings travel back with the image since the render may have run in another process.
+    import renderers
+    result = getattr(renderers, name)(*args)
+    return result, dict(renderers.render_timings.phases)
+
+
+def warm_up_renderers():
+    import renderers
+    renderers.warm_up()
+
+
+def default_pool_size():
+    # The host's cores split between gunicorn's web workers (WEB_WORKERS, set by gunicorn.conf.py), so a host runs
+    # about one render process per core however many workers it has
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_WORKERS', 1))))
+
+
+def start_method():
+    # forkserver children fork from a server that has already imported the app and renderers (mplsoccer)
+    method = os.environ.get('RENDER_POOL_START_METHOD')
+    if method:
+        return method
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+# Matplotlib jobs run in warm worker processes so a render doesn't hold the web worker's GIL
+# workers=None sizes the pool with default_pool_size() when it starts, after gunicorn has forked the worker.
+class RenderExecutor:
+    def __init__(self, workers=None, max_pending=None, timeout=30, queue_timeout=5):
+        self._workers = workers
+        self._max_pending = max_pending
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = None
+        self._pool = None
+        self._pool_pid = None
+        self._inline = False
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return self._workers if self._workers is not None else default_pool_size()
+
+    @property
+    def max_pending(self):
+        return self._max_pending or max(self.workers, 1) * 4
+
+    def render_inline(self):
+        # For a process that runs one job and exits, such as a background callback job, a pool isn't worth starting
+        self._inline = True
+
+    def _get_pool(self):
+        # A pool belongs to the process that started it. With APP_PRELOAD=1 this object is created in the gunicorn
+        # master, so each forked web worker starts a pool of its own on first use.
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                if self._pool_pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.max_pending)
+                context = multiprocessing.get_context(start_method())
+                if context.get_start_method() == 'forkserver':
+                    context.set_forkserver_preload(['__main__', 'renderers'])
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                 initializer=warm_up_renderers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard(self, pool, reason):
+        # A pool whose worker died (OOM kill, segfault) fails every job from then on, and one drawing a job nobody
+        # waits for any more is a process lost until it finishes. Either way the next job starts a fresh pool.
+        # Another thread may already have replaced it.
+        with self._lock:
+            current = self._pool is pool
+            if current:
+                self._pool = None
+        if current:
+            logger.warning("%s; starting a new render pool", reason)
+        # Jobs still running in the old pool fail with BrokenProcessPool, and run() retries them on the new one
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args):
+        return self._submit(fn, *args)[1]
+
+    def _submit(self, fn, *args):
+        if self.workers == 0 or self._inline:
+            # Inline mode, used when RENDER_POOL_SIZE=0 and in background callback jobs
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return None, future
+
+        pool = self._get_pool()
+        slots = self._slots
+        # Back-pressure: wait briefly for a free slot rather than queueing without bound
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise RenderQueueFull(f"{self.max_pending} renders already pending")
+        try:
+            future = pool.submit(fn, *args)
+        except Exception as e:
+            slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard(pool, "Render pool broken")
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return pool, future
+
+    def run(self, fn, *args, timeout=None):
+        # A job caught in a pool that broke under it is retried once on a new pool
+        for attempt in range(2):
+            try:
+                pool, future = self._submit(fn, *args)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                continue
+            try:
+                return future.result(timeout=timeout or self.timeout)
+            except TimeoutError:
+                # A job still queued is dropped; one already drawing would keep its process busy, so the pool goes
+                if not future.cancel() and pool is not None:
+                    self._discard(pool, "Render timed out")
+                raise
+            except BrokenProcessPool:
+                self._discard(pool, "Render pool broken")
+                if attempt:
+                    raise
+
+    def shutdown(self):
+        with self._lock:
+            # A pool inherited through fork is the parent's to shut down
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,183 @@
+import io
+import threading
+import time
+from contextlib import contextmanager
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+from mplsoccer import Pitch, add_image  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from density import density_grid, smooth  # noqa: E402
+
+
+# Matplotlib renders only take plain arrays and images so they can run in a render pool process
+
+# One reusable PNG output buffer per rendering thread
+png_buffers = threading.local()
+
+
+# The three pitch styles used by the app: constructor arguments, figure size and figure facecolor
+PITCH_STYLES = {
+    'heatmap': (dict(pitch_type='wyscout',  # orientation='vertical',
+                     pitch_color='#22312b', line_color='#c7d5cc',
+                     stripe_color='#22312b', stripe_zorder=1), (10, 6), None),
+    'player_heatmap': (dict(pitch_type='wyscout', line_zorder=2, pitch_color='grass', line_color='white'),
+                       (6.6, 4.125), '#22312b'),
+    'passes': (dict(pitch_type='wyscout', pitch_color='grass', line_color='black', goal_type='box'), (12, 8), None),
+}
+
+pitch_templates = {}
+pitch_templates_lock = threading.Lock()
+
+# Phase durations (seconds) of the last render on this thread
+render_timings = threading.local()
+
+# pitch.bin_statistic's grid geometry per (style, bins); renders only swap in their own statistic
+bin_grids = {}
+
+
+def draw_pitch(style):
+    kwargs, figsize, facecolor = PITCH_STYLES[style]
+    pitch = Pitch(**kwargs)
+    fig, ax = pitch.draw(figsize=figsize)
+    if facecolor is not None:
+        fig.set_facecolor(facecolor)
+    return pitch, fig, ax
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        render_timings.phases[name] = time.perf_counter() - start
+
+
+@contextmanager
+def pitch_template(style):
+    # Each style's pitch is drawn once per process; renders draw on top of it and their artists are removed after
+    render_timings.phases = {}
+    with phase('pitch'):
+        with pitch_templates_lock:
+            if style not in pitch_templates:
+                pitch_templates[style] = draw_pitch(style) + (threading.Lock(),)
+        pitch, fig, ax, lock = pitch_templates[style]
+    with lock:
+        axes = list(fig.axes)
+        artists = set(ax.get_children())
+        position = ax.get_position(original=True).frozen()
+        anchor = ax.get_anchor()
+        subplotpars = {name: getattr(fig.subplotpars, name) for name in ['left', 'bottom', 'right', 'top', 'wspace', 'hspace']}
+        try:
+            yield pitch, fig, ax
+        finally:
+            for extra in fig.axes:
+                if extra in axes:
+                    continue
+                if getattr(extra, '_colorbar', None) is not None:
+                    extra._colorbar.remove()
+                else:
+                    extra.remove()
+            for artist in ax.get_children():
+                if artist not in artists:
+                    artist.remove()
+            ax.set_title('')
+            # Tight layout rewrote the subplot params around this render's title and colorbar
+            fig.subplots_adjust(**subplotpars)
+            ax.set_position(position)
+            ax.set_anchor(anchor)
+
+
+def binned_density(style, pitch, x_values, y_values, bins, counts=None):
+    # Smoothed counts from density.density_grid in place of pitch.bin_statistic + gaussian_filter
+    grid = bin_grids.get((style, bins))
+    if grid is None:
+        grid = bin_grids[(style, bins)] = pitch.bin_statistic(np.empty(0), np.empty(0), statistic='count', bins=bins)
+    statistic = density_grid(x_values, y_values, bins) if counts is None else smooth(counts)
+    return {**grid, 'statistic': statistic}
+
+
+def warm_up():
+    # Pool initializer: draw every pitch style up front so the first real job finds its template ready
+    for style in PITCH_STYLES:
+        with pitch_template(style) as (pitch, fig, ax):
+            fig.canvas.draw()
+
+
+def render_heatmap(x_values, y_values, counts=None):
+    with pitch_template('heatmap') as (pitch, fig, ax):
+        with phase('plot'):
+            # Calculate bin statistics; live matches pass their running counts for the same grid instead
+            bin_statistic = binned_density('heatmap', pitch, x_values, y_values, (20, 10), counts)
+
+            # Plot the heatmap
+            pcm = pitch.heatmap(bin_statistic, ax=ax, cmap='hot', edgecolors='#22312b')
+
+            # Add the colorbar
+            cbar = fig.colorbar(pcm, ax=ax, shrink=0.6)
+            cbar.outline.set_edgecolor('#efefef')
+            cbar.ax.yaxis.set_tick_params(color='#efefef')
+            plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='#efefef')
+
+        with phase('encode'):
+            return encode_flipped_png(fig, close=False)
+
+
+def encode_flipped_png(fig, close=True):
+    # Flip the rendered RGBA buffer in place of a PNG decode/flip/re-encode round-trip
+    fig.canvas.draw()
+    width, height = fig.canvas.get_width_height(physical=True)
+    # Raw decoder orientation -1 reads the rows bottom-up, so no flipped copy is made
+    img = Image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, -1)
+    if close:
+        plt.close(fig)
+
+    buf = getattr(png_buffers, 'buf', None)
+    if buf is None:
+        buf = png_buffers.buf = io.BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    img.save(buf, format='png')
+
+    return bytes(buf.getbuffer())
+
+
+def render_second_heatmap(x_values, y_values, title, player_image):
+    with pitch_template('player_heatmap') as (pitch, fig, ax):
+        with phase('plot'):
+            bin_statistic = binned_density('player_heatmap', pitch, x_values, y_values, (25, 25))
+            pcm = pitch.heatmap(bin_statistic, ax=ax, cmap='hot', edgecolors='#22312b')
+            # Add the colorbar
+            cbar = fig.colorbar(pcm, ax=ax, shrink=0.5)
+            cbar.outline.set_edgecolor('white')
+            cbar.ax.yaxis.set_tick_params(color='#efefef')
+            ticks = plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
+            if player_image is not None:
+                add_image(player_image, fig, left=0.034, bottom=0.90, width=0.17, interpolation='hanning')
+            title = ax.set_title(title, color='white', fontsize=20)
+        with phase('encode'):
+            return fig_to_png(fig, close=False)
+
+
+def render_line_breaking_passes_chart(x_values, y_values, x2_values, y2_values, title, player_image):
+    with pitch_template('passes') as (pitch, fig, ax):
+        with phase('plot'):
+            pitch.arrows(x_values, y_values, x2_values, y2_values, ax=ax, color='red', width=2, headwidth=3)
+            pitch.scatter(x2_values, y2_values, s=70, facecolors='none', edgecolor='red', ax=ax)
+            if player_image is not None:
+                add_image(player_image, fig, left=0.034, bottom=0.90, width=0.17, interpolation='hanning')
+            title = ax.set_title(title, color='black', fontsize=20)
+        with phase('encode'):
+            return fig_to_png(fig, close=False)
+
+
+def fig_to_png(fig, close=True):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=200, bbox_inches='tight')
+    if close:
+        plt.close(fig)
+    return buf.getvalue()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import time
+
+
+# Feed an existing match file into LIVE_DIR as if it were arriving live, e.g.
+#   LIVE_DIR=live gunicorn main:server
+#   python replay.py the-final.csv live --rate 5
+# --copies N replays into N matches at once (KEY-1 ... KEY-N) to load-test the live views.
+def replay(source, directory, key, rate, copies=1, loops=1):
+    with open(source) as f:
+        header, *lines = f.read().splitlines()
+    keys = [key] if copies == 1 else [f'{key}-{i}' for i in range(1, copies + 1)]
+    os.makedirs(directory, exist_ok=True)
+    outputs = []
+    for name in keys:
+        output = open(os.path.join(directory, f'{name}.csv'), 'w')
+        output.write(header + '\n')
+        output.flush()
+        outputs.append(output)
+
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    sent = 0
+    try:
+        for _ in range(loops):
+            for line in lines:
+                for output in outputs:
+                    output.write(line + '\n')
+                    output.flush()
+                sent += 1
+                # Pace against the start time so slow writes don't accumulate drift
+                delay = start + sent * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        for output in outputs:
+            output.close()
+    return sent * len(outputs), time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a match CSV into a live feed directory")
+    parser.add_argument('source', help="match CSV to replay")
+    parser.add_argument('directory', help="LIVE_DIR the app follows")
+    parser.add_argument('--key', help="live match key (default: the source file name)")
+    parser.add_argument('--rate', type=float, default=2, help="events per second per match; 0 for no delay")
+    parser.add_argument('--copies', type=int, default=1, help="number of matches to replay into at once")
+    parser.add_argument('--loops', type=int, default=1, help="times to replay the file")
+    args = parser.parse_args()
+
+    key = args.key or os.path.splitext(os.path.basename(args.source))[0]
+    events, seconds = replay(args.source, args.directory, key, args.rate, args.copies, args.loops)
+    print(f"Replayed {events} events in {seconds:.1f}s ({events / seconds:.0f} events/s)")
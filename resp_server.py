@@ -0,0 +1,91 @@
+import argparse
+import socketserver
+import threading
+import time
+
+from shared_store import StoreError, read_reply
+
+
+# A stand-in for Redis that speaks enough of its protocol for RespStore: GET, SET [EX], INCRBY, DEL and a few
+# housekeeping commands, held in memory. Enough to run several workers or hosts against one render cache
+# without a Redis install, e.g.
+#   python resp_server.py --port 6380 & RENDER_CACHE_URL=redis://127.0.0.1:6380 gunicorn -w 4 main:server
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = read_reply(self.rfile)
+            except (ConnectionError, StoreError):
+                return
+            if not isinstance(args, list) or not args:
+                return
+            self.wfile.write(self.server.execute([bytes(arg) for arg in args]))
+
+
+def reply(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, Handler)
+        self.data = {}
+        self.expires = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return self.data.get(key)
+
+    def execute(self, args):
+        command = args[0].upper()
+        with self._lock:
+            if command == b'PING':
+                return reply('PONG')
+            if command in (b'AUTH', b'SELECT'):
+                return reply('OK')
+            if command == b'GET':
+                return reply(self._get(args[1]))
+            if command == b'SET':
+                self.data[args[1]] = args[2]
+                self.expires.pop(args[1], None)
+                if len(args) >= 5 and args[3].upper() == b'EX':
+                    self.expires[args[1]] = time.monotonic() + int(args[4])
+                return reply('OK')
+            if command in (b'INCR', b'INCRBY'):
+                value = int(self._get(args[1]) or 0) + (int(args[2]) if command == b'INCRBY' else 1)
+                self.data[args[1]] = str(value).encode('ascii')
+                return reply(value)
+            if command == b'DEL':
+                removed = [self.data.pop(key, None) for key in args[1:]]
+                return reply(sum(value is not None for value in removed))
+            if command == b'DBSIZE':
+                return reply(len(self.data))
+            if command in (b'FLUSHDB', b'FLUSHALL'):
+                self.data.clear()
+                self.expires.clear()
+                return reply('OK')
+        return b'-ERR unknown command %s\r\n' % command
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol server for the shared render cache")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    with RespServer((args.host, args.port)) as server:
+        print(f"Listening on {args.host}:{args.port}")
+        server.serve_forever()
@@ -0,0 +1,81 @@
+import argparse
+import fcntl
+import json
+import os
+
+from data_files import PLAYER_EVENTS_FILE, game_options
+from ingest import ingest_matches, ingest_players
+
+
+# The match and player event tables in POSIX shared memory. They are columnar tables (see columnar.py) in a
+# directory on /dev/shm, the tmpfs that multiprocessing.shared_memory segments also live in. The first process
+# to start writes them once, which is the gunicorn master with APP_PRELOAD=1. Every worker then maps the same
+# pages instead of parsing and holding its own copy.
+SHARED_MEMORY_ROOT = '/dev/shm'
+SOURCES_FILE = 'sources.json'
+
+
+def source_stamps(files, players_file):
+    stamps = {}
+    for filename in list(files.values()) + [players_file]:
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            continue
+        stamps[os.path.abspath(filename)] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def read_stamps(directory):
+    try:
+        with open(os.path.join(directory, SOURCES_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def export(directory, files, players_file):
+    # Rewriting the tables in place is picked up by running workers as a new columnar generation
+    stamps = source_stamps(files, players_file)
+    ingest_matches(files, os.path.join(directory, 'matches'))
+    ingest_players(players_file, os.path.join(directory, 'players'))
+    tmp = os.path.join(directory, SOURCES_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(stamps, f)
+    os.replace(tmp, os.path.join(directory, SOURCES_FILE))
+
+
+def ensure(name, files, players_file, root=SHARED_MEMORY_ROOT, refresh=False):
+    # Cheap enough to call before every request: up-to-date tables cost a stat per source file. Workers that find
+    # them missing or stale take turns on the lock, and only the first one rewrites them.
+    directory = os.path.join(root, name)
+    if not refresh and read_stamps(directory) == source_stamps(files, players_file):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    with open(directory + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if refresh or read_stamps(directory) != source_stamps(files, players_file):
+            export(directory, files, players_file)
+    return directory
+
+
+def remove(name, root=SHARED_MEMORY_ROOT):
+    directory = os.path.join(root, name)
+    for dirpath, _, filenames in os.walk(directory, topdown=False):
+        for filename in filenames:
+            os.remove(os.path.join(dirpath, filename))
+        os.rmdir(dirpath)
+    if os.path.exists(directory + '.lock'):
+        os.remove(directory + '.lock')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write, refresh or remove the shared-memory event tables")
+    parser.add_argument('--name', default=os.environ.get('SHARED_EVENTS_NAME', 'qatar-events'))
+    parser.add_argument('--remove', action='store_true', help="free the shared memory instead")
+    args = parser.parse_args()
+
+    if args.remove:
+        remove(args.name)
+    else:
+        ensure(args.name, game_options, PLAYER_EVENTS_FILE, refresh=True)
@@ -0,0 +1,195 @@
+import fcntl
+import logging
+import os
+import socket
+import tempfile
+import threading
+from urllib.parse import unquote, urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+class StoreError(Exception):
+    pass
+
+
+def open_store(location, **kwargs):
+    # redis://[:password@]host[:port][/db] for a Redis-protocol server, anything else is a directory
+    if not location:
+        return None
+    if location.startswith('redis://'):
+        return RespStore.from_url(location, **kwargs)
+    return FileStore(location)
+
+
+# Entries as files under a directory, written then renamed, so every worker on the host reads the same
+# entries. Counters are small files updated under an flock.
+class FileStore:
+    # Only processes on this host can read it
+    remote = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'counters'), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent workers never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Could not write store entry %s", key)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def incr(self, name, amount=1):
+        fd = os.open(os.path.join(self.directory, 'counters', name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            value = int(os.read(fd, 32) or 0) + amount
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(value).encode('ascii'))
+            return value
+        finally:
+            os.close(fd)
+
+    def counter(self, name):
+        try:
+            with open(os.path.join(self.directory, 'counters', name), 'rb') as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+
+# Entries in Redis, or any server that speaks its protocol (RESP), shared by workers on every host that
+# points at it. Each thread keeps one connection and reconnects once if it has dropped.
+class RespStore:
+    # Other hosts read it too
+    remote = True
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, prefix='render:', ttl=None, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        parts = urlsplit(url)
+        path = parts.path.strip('/')
+        return cls(host=parts.hostname or 'localhost', port=parts.port or 6379, db=int(path) if path else 0,
+                   password=unquote(parts.password) if parts.password else None, **kwargs)
+
+    def get(self, key):
+        value = self.execute('GET', self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def get_bytes(self, key):
+        return self.execute('GET', self.prefix + key)
+
+    def set(self, key, value):
+        if self.ttl:
+            self.execute('SET', self.prefix + key, value, 'EX', self.ttl)
+        else:
+            self.execute('SET', self.prefix + key, value)
+
+    def incr(self, name, amount=1):
+        return self.execute('INCRBY', self.prefix + 'counters:' + name, amount)
+
+    def counter(self, name):
+        return int(self.execute('GET', self.prefix + 'counters:' + name) or 0)
+
+    def execute(self, *args):
+        command = encode_command(args)
+        for attempt in range(2):
+            connection = self._connect()
+            try:
+                connection[0].sendall(command)
+                return read_reply(connection[1])
+            except OSError as e:
+                self._close()
+                if attempt:
+                    raise StoreError(f"{self.host}:{self.port}: {e}") from e
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and connection[2] == os.getpid():
+            return connection
+        # A connection inherited through fork is the parent's; it must not be shared
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise StoreError(f"{self.host}:{self.port}: {e}") from e
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = self._local.connection = (sock, sock.makefile('rb'), os.getpid())
+        if self.password:
+            sock.sendall(encode_command(['AUTH', self.password]))
+            read_reply(connection[1])
+        if self.db:
+            sock.sendall(encode_command(['SELECT', self.db]))
+            read_reply(connection[1])
+        return connection
+
+    def _close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+
+def encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode('ascii')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(f):
+    line = f.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode('utf-8')
+    if kind == b'-':
+        raise StoreError(rest.decode('utf-8'))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = f.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("connection closed")
+        return data[:-2]
+    if kind == b'*':
+        length = int(rest)
+        return None if length < 0 else [read_reply(f) for _ in range(length)]
+    raise StoreError(f"unexpected reply {line!r}")
@@ -0,0 +1,13 @@
+import sys
+import time
+
+import main
+
+
+# Run before starting gunicorn, e.g. python warm_cache.py, with the same RENDER_CACHE_DIR or RENDER_CACHE_URL
+if __name__ == '__main__':
+    if main.renders.store is None:
+        print("RENDER_CACHE_DIR is empty; rendered images will not outlive this process", file=sys.stderr)
+    start = time.perf_counter()
+    count = main.warm_render_cache()
+    print(f"Pre-rendered {count} images in {time.perf_counter() - start:.1f}s")
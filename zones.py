@@ -0,0 +1,174 @@
+import functools
+
+import numpy as np
+
+from density import PITCH_EXTENT
+
+
+# Coordinates are whole numbers from 0 to 100 (event_schema holds them as UInt8), so every point falls on one of
+# 101 x 101 lattice cells. A zone is the set of cells it covers, worked out once per zone. The index keeps each
+# match's events sorted by cell, so the events in a zone are a few contiguous runs of rows rather than a scan.
+SIDE = PITCH_EXTENT + 1
+CELLS = SIDE * SIDE
+
+# Columns a zone query can filter on, as keyword arguments of ZoneIndex.rows
+QUERY_COLUMNS = {'team': 'Team', 'player': 'Player', 'event': 'Event', 'type': 'Type'}
+
+
+# One or more polygons of (x, y) points in event coordinates, x along the pitch and y across it; a point is in
+# the zone if it is inside or on the edge of any of them
+class Zone:
+    def __init__(self, *polygons):
+        self.polygons = tuple(tuple((float(x), float(y)) for x, y in polygon) for polygon in polygons)
+
+    @classmethod
+    def rectangle(cls, x0, y0, x1, y1):
+        return cls(rectangle(x0, y0, x1, y1))
+
+    def __eq__(self, other):
+        return isinstance(other, Zone) and self.polygons == other.polygons
+
+    def __hash__(self):
+        return hash(self.polygons)
+
+    @property
+    def runs(self):
+        return zone_runs(self)
+
+    def contains(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+        for polygon in self.polygons:
+            inside |= polygon_contains(polygon, x, y)
+        return inside
+
+
+def rectangle(x0, y0, x1, y1):
+    return [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+
+
+def ellipse(cx, cy, rx, ry, points=32):
+    angles = np.linspace(0, 2 * np.pi, points, endpoint=False)
+    return list(zip(np.round(cx + rx * np.cos(angles), 3), np.round(cy + ry * np.sin(angles), 3)))
+
+
+def polygon_contains(polygon, x, y):
+    # Even-odd ray casting, plus the polygon's edges themselves so rectangles are closed at both ends
+    inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+    on_edge = np.zeros_like(inside)
+    for (x0, y0), (x1, y1) in zip(polygon, polygon[1:] + polygon[:1]):
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inside ^= crosses & (x < x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+        within = (np.minimum(x0, x1) <= x) & (x <= np.maximum(x0, x1)) & (np.minimum(y0, y1) <= y) & (y <= np.maximum(y0, y1))
+        on_edge |= within & np.isclose((x1 - x0) * (y - y0), (y1 - y0) * (x - x0))
+    return inside | on_edge
+
+
+@functools.lru_cache(maxsize=256)
+def zone_runs(zone):
+    # The zone's cells as [start, stop) runs of cell numbers, cell = x * SIDE + y
+    x, y = np.divmod(np.arange(CELLS), SIDE)
+    covered = zone.contains(x, y).astype(np.int8)
+    edges = np.diff(np.concatenate([[0], covered, [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+# Named zones on the pitch as the Games view draws it: the two ends left and right, y = 0 along the top.
+# Match files don't swap ends at half time or per team, so each end is a zone of its own.
+ZONES = {
+    'Left penalty area': Zone.rectangle(0, 19, 16, 81),
+    'Right penalty area': Zone.rectangle(84, 19, 100, 81),
+    'Either penalty area': Zone(rectangle(0, 19, 16, 81), rectangle(84, 19, 100, 81)),
+    'Left six-yard box': Zone.rectangle(0, 37, 6, 63),
+    'Right six-yard box': Zone.rectangle(94, 37, 100, 63),
+    'Left third': Zone.rectangle(0, 0, 33, 100),
+    'Middle third': Zone.rectangle(34, 0, 66, 100),
+    'Right third': Zone.rectangle(67, 0, 100, 100),
+    'Top half-space': Zone.rectangle(0, 19, 100, 37),
+    'Bottom half-space': Zone.rectangle(0, 63, 100, 81),
+    # The centre circle's 9.15 m radius on a 105 x 68 m pitch
+    'Centre circle': Zone(ellipse(50, 50, 8.7, 13.5)),
+}
+
+
+def cells(x, y):
+    # Each point's lattice cell; missing or off-pitch points get CELLS, which no zone covers
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = (x >= 0) & (x <= PITCH_EXTENT) & (y >= 0) & (y <= PITCH_EXTENT)
+    return np.where(valid, np.where(valid, x, 0).astype(np.int64) * SIDE + np.where(valid, y, 0).astype(np.int64),
+                    CELLS)
+
+
+def expand_ranges(starts, stops):
+    # np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)]) without the Python loop
+    lengths = stops - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if not len(lengths):
+        return np.empty(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    steps = np.ones(ends[-1], dtype=np.int64)
+    steps[0] = starts[0]
+    steps[ends[:-1]] = starts[1:] - (starts[:-1] + lengths[:-1]) + 1
+    return np.cumsum(steps)
+
+
+# Rows sorted by (match, cell), and where each (match, cell) bucket starts
+class _Buckets:
+    def __init__(self, cell, match, matches):
+        keys = match * (CELLS + 1) + cell
+        self.order = np.argsort(keys, kind='stable').astype(np.int32 if len(keys) < 2**31 else np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=matches * (CELLS + 1)))])
+
+    def rows(self, runs, matches):
+        base = matches[:, None] * (CELLS + 1)
+        return self.order[expand_ranges(self.offsets[base + runs[0]].ravel(), self.offsets[base + runs[1]].ravel())]
+
+
+# Origin and destination points of every event in the store, bucketed by lattice cell within each match.
+# rows() answers a zone query as positions into `events`, in bucket order.
+class ZoneIndex:
+    def __init__(self, events, slices):
+        self.events = events
+        self.slices = slices
+        self.matches = list(slices)
+        match = np.full(len(events), len(self.matches), dtype=np.int64)
+        for i, rows in enumerate(slices.values()):
+            match[rows] = i
+        self.categories = {}
+        self._codes = {}
+        for column in QUERY_COLUMNS.values():
+            values = events[column].astype('category')
+            self.categories[column] = values.cat.categories
+            self._codes[column] = values.cat.codes.to_numpy()
+        self.origin = _Buckets(cells(events['X'].to_numpy(dtype=float, na_value=np.nan),
+                                     events['Y'].to_numpy(dtype=float, na_value=np.nan)), match, len(self.matches) + 1)
+        self.destination = _Buckets(cells(events['X2'].to_numpy(dtype=float, na_value=np.nan),
+                                          events['Y2'].to_numpy(dtype=float, na_value=np.nan)),
+                                    match, len(self.matches) + 1)
+
+    def rows(self, zone, end=False, match=None, **filters):
+        # Events starting in the zone, or ending in it with end=True, in one match or all of them; filters are
+        # team, player, event and type, and a value the data has never seen matches nothing
+        if match is None:
+            matches = np.arange(len(self.matches))
+        elif match in self.slices:
+            matches = np.array([self.matches.index(match)])
+        else:
+            return np.empty(0, dtype=np.int64)
+        rows = (self.destination if end else self.origin).rows(zone.runs, matches)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            column = QUERY_COLUMNS[name]
+            categories = self.categories[column]
+            if value not in categories:
+                return np.empty(0, dtype=np.int64)
+            rows = rows[self._codes[column][rows] == categories.get_loc(value)]
+        return rows
+
+    def count(self, zone, end=False, match=None, **filters):
+        return len(self.rows(zone, end, match, **filters))